@@ -0,0 +1,124 @@
+"""
+Сборка офлайн-справочника мест gazetteer.csv из выгрузки GeoNames.
+
+Справочник не хранится в репозитории: его нужно собрать перед запуском API,
+иначе все адреса запрашиваются у Nominatim. Выгрузки берутся на
+https://download.geonames.org/export/dump/:
+
+    cities15000.zip (или cities5000.zip, cities1000.zip) - населённые пункты;
+    alternateNamesV2.zip - необязательно, названия на разных языках.
+
+Пример:
+
+    python build_gazetteer.py cities15000.zip --alternate-names alternateNamesV2.zip --languages ru,en,uz
+"""
+
+import argparse
+import csv
+import io
+import math
+import zipfile
+
+from utils.gazetteer import GAZETTEER_DEFAULT_RADIUS_KM, GAZETTEER_PATH
+
+# Колонки файла населённых пунктов GeoNames
+GEONAMES_ID, GEONAMES_NAME, GEONAMES_LAT, GEONAMES_LON, GEONAMES_POPULATION = 0, 1, 4, 5, 14
+# Колонки файла alternateNamesV2: id названия, id места, язык, название, предпочтительное
+ALTERNATE_PLACE_ID, ALTERNATE_LANGUAGE, ALTERNATE_NAME, ALTERNATE_PREFERRED = 1, 2, 3, 4
+# Границы радиуса покрытия места в километрах
+MIN_RADIUS_KM = 3.0
+MAX_RADIUS_KM = 30.0
+
+
+def open_dump(path):
+    # Открывает txt-файл выгрузки или единственный txt-файл внутри zip-архива
+    if not path.endswith(".zip"):
+        return open(path, encoding="utf-8", newline="")
+
+    archive = zipfile.ZipFile(path)
+    name = next(
+        name for name in archive.namelist()
+        if name.endswith(".txt") and not name.startswith("readme")
+    )
+    return io.TextIOWrapper(archive.open(name), encoding="utf-8", newline="")
+
+
+def read_rows(path):
+    with open_dump(path) as file:
+        for line in file:
+            yield line.rstrip("\n").split("\t")
+
+
+def radius_km(population):
+    # Радиус покрытия растёт с населением: ~3 км для посёлка, ~20 км для миллионного города
+    if not population:
+        return GAZETTEER_DEFAULT_RADIUS_KM
+    return min(MAX_RADIUS_KM, max(MIN_RADIUS_KM, 0.02 * math.sqrt(population)))
+
+
+def load_places(cities_path):
+    places = {}
+    for row in read_rows(cities_path):
+        try:
+            population = int(row[GEONAMES_POPULATION] or 0)
+            places[row[GEONAMES_ID]] = {
+                "name": row[GEONAMES_NAME],
+                "lat": float(row[GEONAMES_LAT]),
+                "lon": float(row[GEONAMES_LON]),
+                "radius_km": round(radius_km(population), 1),
+            }
+        except (IndexError, ValueError):
+            continue
+    return places
+
+
+def add_alternate_names(places, alternate_path, languages):
+    # Предпочтительное название на языке заменяет ранее найденное, остальные - только первое
+    preferred = set()
+    for row in read_rows(alternate_path):
+        if len(row) <= ALTERNATE_NAME:
+            continue
+        place = places.get(row[ALTERNATE_PLACE_ID])
+        language = row[ALTERNATE_LANGUAGE]
+        if place is None or language not in languages:
+            continue
+
+        column = f"name_{language}"
+        is_preferred = len(row) > ALTERNATE_PREFERRED and row[ALTERNATE_PREFERRED] == "1"
+        key = (row[ALTERNATE_PLACE_ID], language)
+        if column not in place or (is_preferred and key not in preferred):
+            place[column] = row[ALTERNATE_NAME]
+            if is_preferred:
+                preferred.add(key)
+
+
+def write_gazetteer(places, output_path, languages):
+    columns = ["name", "lat", "lon", "radius_km"] + [f"name_{language}" for language in languages]
+    with open(output_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        for place in places.values():
+            writer.writerow(place)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка gazetteer.csv из выгрузки GeoNames")
+    parser.add_argument("cities", help="cities15000.zip или распакованный cities15000.txt")
+    parser.add_argument("--alternate-names", help="alternateNamesV2.zip для названий на разных языках")
+    parser.add_argument("--languages", default="ru,en,uz", help="языки названий через запятую")
+    parser.add_argument("--output", default=GAZETTEER_PATH, help="путь результата")
+    args = parser.parse_args()
+
+    languages = [language for language in args.languages.split(",") if language]
+    places = load_places(args.cities)
+    if args.alternate_names:
+        add_alternate_names(places, args.alternate_names, set(languages))
+    else:
+        languages = []
+
+    write_gazetteer(places, args.output, languages)
+    print(f"Справочник {args.output}: {len(places)} мест")
+
+
+if __name__ == "__main__":
+    main()
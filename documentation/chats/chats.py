@@ -7,7 +7,7 @@ send_new_message = """
 - `Authorization:` Bearer Token
 - `uid`: Id авторизованного пользователя.
 - `text`: Текст сообщения, смайлики сразу в тексте надо отправлять. (Объязательный, можно отправить пустой текст) 
-- `pictures`: Массив из файлов картинок объязательно в формате File. (Неояхательный параметр)
+- `pictures`: Массив из файлов картинок объязательно в формате File. (Неояхательный параметр) В сообщении сохраняются `pictures` и `pictures_variants` с URL вариантов `thumbnail`, `card` и `full`.
 - `selected_chat_id`: Id Чата, если есть, можно не отправлять если сообщение надо отправить новому пользователю.
 - `recipient_id`: Id пользователя которому надо отправить сообщение, надо указать только в том случаи если чата с ним нету, в ином случаи сообщение отправиться в чат с ним, а паарметр будет игнорирован.
 ```
@@ -23,4 +23,113 @@ send_new_message = """
 - `405`: Нельзя отправлять сообщение самому себе.
 - `500`: Произошла внутренняя ошибка сервера.
 ```
-"""
\ No newline at end of file
+"""
+
+get_chats_list = """
+Эндпоинт возвращает заголовки чатов авторизованного пользователя без сообщений, отсортированные по `last_action_date` от новых к старым.
+
+**Параметры запроса:**
+```
+- `Authorization:` Bearer Token
+```
+**Ответ:**
+```
+[
+    {
+        chat_id: 'id чата',
+        last_action: 'Текст последнего сообщения или Photo',
+        last_action_date: '2024-07-10T12:00:00',
+        users: { uid: { uid, last_action_viewed } },
+        companion: { uid, username, avatar, avatar_variants, rating, last_active },
+        unread: 'Количество непрочитанных сообщений в чате'
+    }
+]
+```
+**Коды ответов:**
+```
+- `200`: Запрос выполнен успешно, данные получены.
+- `401`: Неавторизованный пользователь.
+```
+"""
+
+get_chat_messages = """
+Эндпоинт возвращает историю сообщений чата по страницам, начиная с последних сообщений.
+Сообщения на странице идут в хронологическом порядке. Если есть более ранние сообщения, в заголовке ответа `X-Next-Cursor` передаётся курсор, который надо отправить в `cursor` для получения предыдущей страницы.
+
+**Параметры запроса:**
+```
+- `Authorization:` Bearer Token
+- `chat_id`: Id чата в пути запроса.
+- `limit`: Количество сообщений на странице, от 1 до 100, по умолчанию 30.
+- `cursor`: Курсор из заголовка `X-Next-Cursor` предыдущего ответа. (Неояхательный параметр)
+```
+**Ответ:**
+```
+[
+    {
+        id: 'id сообщения',
+        sender_id: 'id отправителя',
+        text: 'Текст сообщения',
+        timestamp: '2024-07-10T12:00:00',
+        pictures: [{ thumbnail: 'url', card: 'url', full: 'url' }] или null
+    }
+]
+```
+**Коды ответов:**
+```
+- `200`: Запрос выполнен успешно, данные получены.
+- `401`: Неавторизованный пользователь.
+- `404`: Чат не найден или пользователь не является его участником.
+```
+"""
+
+get_unread_total = """
+Эндпоинт возвращает общее количество непрочитанных сообщений пользователя во всех чатах (для значка на главном экране).
+
+**Параметры запроса:**
+```
+- `Authorization:` Bearer Token
+```
+**Ответ:**
+```
+{ unread_total: 5 }
+```
+**Коды ответов:**
+```
+- `200`: Запрос выполнен успешно, данные получены.
+- `401`: Неавторизованный пользователь.
+```
+"""
+
+mark_read = """
+Эндпоинт отмечает все сообщения чата прочитанными: обнуляет счётчик непрочитанных чата и уменьшает общий счётчик пользователя, у участника чата `last_action_viewed` становится `true`.
+
+**Параметры запроса:**
+```
+- `Authorization:` Bearer Token
+- `chat_id`: Id чата в пути запроса.
+```
+**Ответ:**
+```
+{ unread_total: 'Оставшееся общее количество непрочитанных сообщений' }
+```
+**Коды ответов:**
+```
+- `200`: Запрос выполнен успешно.
+- `401`: Неавторизованный пользователь.
+- `404`: Чат не найден или пользователь не является его участником.
+```
+"""
+
+chats_websocket = """
+WebSocket `/chats/ws?token=<idToken>` для получения событий чатов в реальном времени.
+Токен тот же, что и в заголовке Authorization; при неверном токене соединение закрывается с кодом 1008.
+Подключение получает события всех чатов пользователя, включая новые.
+
+**События:**
+```
+{ type: 'message', chat_id, message: { id, sender_id, text, timestamp, pictures } }
+{ type: 'last_action', chat_id, last_action, last_action_date }
+```
+При заданной переменной окружения `REDIS_URL` события рассылаются через Redis и доходят до подключений любого воркера.
+"""
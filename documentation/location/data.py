@@ -41,5 +41,8 @@ GET /location/get_location_name?latitude=55.7558&longitude=37.6173&language=ru
 - `Этот эндпоинт используется для получения названия локации на основе координат и языкового кода.
 - `Параметры latitude и longitude являются обязательными.
 - `Параметр language является необязательным и по умолчанию установлен на 'en'.
+- `Сначала адрес ищется в офлайн-справочнике мест (CSV-файл GAZETTEER_PATH с колонками name, lat, lon, radius_km, name_<язык>), Nominatim запрашивается только для мест вне справочника и если не отключён GEOCODER_FALLBACK=0.
+- `Справочник не хранится в репозитории: перед развёртыванием его нужно собрать из выгрузки GeoNames скриптом build_gazetteer.py. Без файла все адреса запрашиваются у Nominatim.
+- `Координаты округляются до 3 знаков после запятой (~110 м), результаты кэшируются в памяти и на диске (или в Redis, если задан REDIS_URL).
 
 """
\ No newline at end of file
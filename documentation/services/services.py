@@ -12,6 +12,12 @@ get_all = """
 - `min_price`: (необязательный) Минимальная цена для фильтрации.
 - `max_price`: (необязательный) Максимальная цена для фильтрации.
 - `payment_method_id`: (необязательный) Метод оплаты для фильтрации.
+- `limit`: (необязательный) Количество услуг на странице, не больше 100.
+- `cursor`: (необязательный) Курсор следующей страницы из заголовка `X-Next-Cursor` предыдущего ответа.
+- `sort`: (необязательный) Поле сортировки: `price`, `created_at`, `rating_count`.
+- `order`: (необязательный) Порядок сортировки: `asc` (по умолчанию) или `desc`.
+
+Общее количество услуг возвращается в заголовке `X-Total-Count`.
 
 **Пример ответа**:
 ```json
@@ -47,6 +53,7 @@ get_all = """
 **Ответ:**
 - `200 OK`: Успешный запрос, возвращает список объявлений или одно объявление.
 - `400 Bad Request`: Минимальная цена больше максимальной цены.
+- `422 Unprocessable Entity`: Неверный курсор или поле сортировки.
 - `404 Not` Found: Объявления не найдены или указанное объявление не найдено.
 ```
 """
@@ -91,6 +98,16 @@ get_services_by_filters = """
 - `payment_method_id`: (необязательный) ID метода оплаты.
 - `minPrice`: (необязательный) Минимальная цена услуги.
 - `maxPrice`: (необязательный) Максимальная цена услуги.
+- `name`: (необязательный) Поисковый запрос по названию и описанию услуги. Регистр и буква "ё" не учитываются, последние слова можно вводить не полностью.
+- `lat`, `lon`, `distance`: (необязательные) Координаты и радиус поиска в километрах.
+- `limit`: (необязательный) Количество услуг на странице, не больше 100.
+- `cursor`: (необязательный) Курсор следующей страницы из заголовка `X-Next-Cursor` предыдущего ответа.
+- `sort`: (необязательный) Поле сортировки: `relevance` (нужен `name`, используется по умолчанию при поиске по `name`), `distance` (нужны `lat` и `lon`), `price`, `created_at`, `rating_count`.
+- `order`: (необязательный) Порядок сортировки: `asc` (по умолчанию) или `desc`.
+
+**Заголовки ответа:**
+- `X-Total-Count`: Общее количество найденных услуг.
+- `X-Next-Cursor`: Курсор следующей страницы, отсутствует на последней странице.
 
 **Пример ответа:**
 ```
@@ -146,6 +163,14 @@ add_new_service = """
 - `service_category_id`: (обязательный) Идентификатор категории услуги.
 - `payment_method_id`: (опциональный) Идентификатор способа оплаты.
 ```
+**Адрес услуги**:
+```
+- `location_name` определяется в фоне: в ответе и сразу после создания это пустая строка, адрес дописывается в услугу через несколько секунд.
+```
+**Картинки услуги**:
+```
+- `pictures` содержит URL картинок в размере до 1920px, `pictures_variants` - для каждой картинки словарь URL вариантов `thumbnail` (до 256px), `card` (до 800px) и `full`. Для списков используйте `thumbnail`.
+```
 **Пример запроса**:
 ```bash
 curl -X POST "http://localhost:8000/services/add" \
@@ -222,6 +247,10 @@ update_service = """
 - `phone_number`: (необязательный) Новый телефонный номер владельца услуги.
 - `email`: (необязательный) Новая электронная почта владельца услуги.
 ```
+**Адрес услуги**:
+```
+- `Если координаты изменились, location_name становится пустой строкой и определяется в фоне.
+```
 **Пример запроса**:
 ```bash
 curl -X PUT "http://localhost:8000/services/update" \
@@ -41,7 +41,7 @@ update_user = """
 - `'Authorization': `Bearer ${idToken}`
 - `uid`: Id пользователя для проверки совместимости с токеном, если не отправить то вернёться ошибка
 - `username`: Имя пользователя, в формате name + ' ' + surname
-- `avatar`: Новый аватар пользователя (опционально), старый удаляется и заменяется новым если отправлен
+- `avatar`: Новый аватар пользователя (опционально), старый удаляется и заменяется новым если отправлен. В пользователе сохраняются `avatar` и `avatar_variants` с URL вариантов `thumbnail`, `card` и `full`
 - `old_password`: (Опционально) Проверяется если у пользователя был пароль на аккаунте и при изменении нового не отправлен старый, то вернётся ошибка об этом
 - `new_password`: (Опционально) Если отправляется новый пароль то наду учитывать что понадобиться старый
 - `languages`: (Опционально), языки которые знает пользователь, в формате массива ["Russian", ...]
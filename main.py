@@ -23,6 +23,13 @@ from routers.chats import router as chats_router
 
 from routers.notifications import router as notifications_router
 
+from utils.services_replica import services_replica
+from utils.location_enrichment import location_enrichment
+from utils.storage_gc import storage_gc
+from utils.chat_gateway import chat_gateway
+from utils.bookings import migrate_bookings
+from utils.chats import migrate_chat_messages, migrate_chat_pairs, remove_legacy_chats
+
 app = FastAPI()
 
 # Настройка CORS
@@ -51,9 +58,37 @@ app.add_middleware(
         "Access-Control-Allow-Headers",
         "Access-Control-Allow-Methods",
     ],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
 
+@app.on_event("startup")
+async def startup():
+    # Засеваем локальную реплику услуг и подписываемся на изменения в Firebase
+    await services_replica.start()
+    # Фоновое определение адресов услуг
+    await location_enrichment.start()
+    # Фоновое удаление файлов из Storage
+    await storage_gc.start()
+    # Подписка на события чатов других воркеров
+    await chat_gateway.start()
+    # Перенос броней из документов пользователей в индексы при первом запуске
+    await migrate_bookings()
+    # Разделение старых чатов на заголовки и сообщения, затем индекс пар собеседников
+    await migrate_chat_messages()
+    await migrate_chat_pairs()
+    # Удаление старого узла чатов, когда клиенты перешли на новый формат
+    await remove_legacy_chats()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await chat_gateway.stop()
+    await storage_gc.stop()
+    await location_enrichment.stop()
+    await services_replica.stop()
+
+
 @app.get("/", tags=["Основная"],
          summary="Основная информация для перехода в документацию.")
 def read_item(request: Request):
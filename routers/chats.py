@@ -12,16 +12,28 @@ from fastapi import (
     Form,
     Query,
     Header,
-    Response
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status
 )
-from typing import List
+from typing import List, Optional
 
 from utils.user import get_current_user
+from utils.firebase_db import get_user, run_db
 from utils.chats import addChatToUsers, upload_picture_to_storage, create_new_chat, add_message_to_chat, getChatByUserId, change_chat_last_action
+from utils.chats import get_chat_messages, get_unread_total, get_user_chats, is_chat_member, mark_chat_read
+from utils.main import set_pagination_headers
+from utils.chat_gateway import chat_gateway
+from schemas.chats import ChatHeaderSchema, ChatMessageSchema, UnreadTotalSchema
 from documentation.chats import chats as chats_ducumentation
 
 router = APIRouter()
 
+# Количество сообщений на странице истории чата по умолчанию и максимум
+MESSAGES_PAGE_LIMIT = 30
+MAX_MESSAGES_PAGE_LIMIT = 100
+
 @router.post('/send_new_message',
     summary="Эндпоинт для добавления нового сообщения в базу.",
     description=chats_ducumentation.send_new_message)
@@ -42,8 +54,7 @@ async def send_new_message(
         raise HTTPException(status_code=403, detail="Пользователь не идентефицирован.")
 
     # Получаем данные пользователя
-    user_ref = db.reference(f"/users/{uid}")
-    user_data = user_ref.get()
+    user_data = await get_user(uid)
 
     if not user_data:
         raise HTTPException(status_code=403, detail="Пользователь не найден.")
@@ -53,8 +64,7 @@ async def send_new_message(
         raise HTTPException(status_code=405, detail="Нельзя отправлять сообщение самому себе.")
     else:
         # Получаем данные поулчателя сообщений чтобы узнатть существует ли он
-        recipient_user_ref = db.reference(f"/users/{recipient_id}")
-        recipient_user_data = recipient_user_ref.get()
+        recipient_user_data = await get_user(recipient_id)
 
         if not recipient_user_data:
             raise HTTPException(status_code=404, detail="Пользователь не найден.")
@@ -62,11 +72,8 @@ async def send_new_message(
     chat_id = selected_chat_id
 
     if recipient_id and selected_chat_id is None:
-        # Получаем список чатов пользователя для дальнейшей проверки
-        users_chats = user_data.get("chats", [])
-
-        # Находим данные чатов пользователя
-        chat_id = await getChatByUserId(users_chats, recipient_id)
+        # Находим чат с получателем по индексу пар собеседников
+        chat_id = await getChatByUserId(uid, recipient_id)
 
     # Если чата не найдено то создаем его
     if chat_id is None:
@@ -80,4 +87,78 @@ async def send_new_message(
     # Добавляем сообщение в чат
     await add_message_to_chat(chat_id=chat_id, text=text, sender_id=uid, pictures=pictures)
 
-    return {"message": "Сообщение успешно отправлено."}
\ No newline at end of file
+    return {"message": "Сообщение успешно отправлено."}
+
+@router.get('/list',
+    summary="Получение списка чатов авторизованного пользователя.",
+    description=chats_ducumentation.get_chats_list,
+    response_model=List[ChatHeaderSchema])
+async def get_chats_list(current_user: dict = Depends(get_current_user)):
+    # Заголовки чатов без сообщений, от последних действий к ранним
+    return await get_user_chats(current_user["uid"])
+
+@router.get('/{chat_id}/messages',
+    summary="Получение истории сообщений чата по страницам.",
+    description=chats_ducumentation.get_chat_messages,
+    response_model=List[ChatMessageSchema])
+async def get_messages(
+    chat_id: str,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    limit: int = Query(MESSAGES_PAGE_LIMIT, ge=1, le=MAX_MESSAGES_PAGE_LIMIT, description="Количество сообщений на странице"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей (более ранней) страницы"),
+):
+    # Историю чата могут получить только его участники
+    if not await is_chat_member(chat_id, current_user["uid"]):
+        raise HTTPException(status_code=404, detail="Чат не найден.")
+
+    messages, next_cursor = await get_chat_messages(chat_id, limit, cursor)
+
+    set_pagination_headers(response, next_cursor=next_cursor)
+
+    return messages
+
+@router.get('/unread_total',
+    summary="Общее количество непрочитанных сообщений пользователя.",
+    description=chats_ducumentation.get_unread_total,
+    response_model=UnreadTotalSchema)
+async def get_chats_unread_total(current_user: dict = Depends(get_current_user)):
+    return {"unread_total": await get_unread_total(current_user["uid"])}
+
+@router.post('/{chat_id}/mark_read',
+    summary="Отметка сообщений чата прочитанными.",
+    description=chats_ducumentation.mark_read,
+    response_model=UnreadTotalSchema)
+async def mark_read(
+    chat_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    # Отмечать прочитанным могут только участники чата
+    if not await is_chat_member(chat_id, current_user["uid"]):
+        raise HTTPException(status_code=404, detail="Чат не найден.")
+
+    return {"unread_total": await mark_chat_read(chat_id, current_user["uid"])}
+
+@router.websocket('/ws')
+async def chats_websocket(websocket: WebSocket, token: str = Query(...)):
+    # Описание событий: chats_ducumentation.chats_websocket
+    # Браузеры не передают заголовки в WebSocket, поэтому токен приходит в параметре token.
+    # Проверка токена может загружать сертификаты Google, поэтому выполняется в пуле потоков
+    try:
+        current_user = await run_db(get_current_user, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    uid = current_user["uid"]
+    await websocket.accept()
+    chat_gateway.connect(uid, websocket)
+
+    try:
+        # Сообщения от клиента не обрабатываются, чтение нужно чтобы заметить отключение
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        chat_gateway.disconnect(uid, websocket)
@@ -22,6 +22,7 @@ from typing import List, Optional
 from firebase_conf import firebase
 from utils.user import get_current_user
 from utils.notifications import set_notifications_array, delete_notifications
+from utils.firebase_db import get_user, set_notifications
 from documentation.users import notifications as notifications_documentation
 
 router = APIRouter()
@@ -40,8 +41,7 @@ async def get_all_user_notifications(
         )
 
     # Получаем данные пользователя
-    user_ref = db.reference(f"/users/{uid}")
-    user_data = user_ref.get()
+    user_data = await get_user(uid)
 
     if not user_data:
         raise HTTPException(
@@ -80,8 +80,7 @@ async def delete_selected_norifications(
         )
 
     # Получаем данные пользователя
-    user_ref = db.reference(f"/users/{uid}")
-    user_data = user_ref.get()
+    user_data = await get_user(uid)
 
     if not user_data:
         raise HTTPException(
@@ -100,7 +99,7 @@ async def delete_selected_norifications(
     user_data["notifications"] = new_array
 
     # Сохарняем данные в базе
-    user_ref.set(user_data)
+    await set_notifications(uid, new_array)
 
     # Генерируем новые данные
     notifications = await set_notifications_array(user_data["notifications"])
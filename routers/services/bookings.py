@@ -24,7 +24,18 @@ from documentation.services import services as services_documentation
 
 from schemas.services.services import *
 from utils.user import get_current_user
-from utils.notifications import add_new_notification
+from utils.notifications import push_notification
+from utils.bookings import (
+    OWNER_BOOKINGS_PATH,
+    USER_BOOKINGS_PATH,
+    delete_booking,
+    get_bookings,
+    has_booked_service,
+    save_booking,
+)
+from utils.firebase_db import get_booking, get_service, update_booking
+from utils.profiles import get_profile, get_profiles
+from utils.services import get_services_by_ids
 
 router = APIRouter()
 
@@ -53,25 +64,20 @@ async def book_service(
             status_code=422, detail="Неправильные данные."
         )
 
-    # Получаем данные пользователя
-    user_ref = db.reference(f"/users/{uid}")
-    user_data = user_ref.get()
-
-    if user_data is None:
+    # Проверяем существование пользователя по его публичному профилю
+    if await get_profile(uid) is None:
         raise HTTPException(
             status_code=404, detail="Пользователь не найден."
         )
 
     # Проверяем, не бронировал ли пользователь уже эту услугу
-    if "booked_services" in user_data:
-        for booking in user_data["booked_services"]:
-            if booking["service_id"] == service_id:
-                raise HTTPException(
-                    status_code=401, detail="Вы уже бронировали эту услугу."
-                )
+    if await has_booked_service(uid, service_id):
+        raise HTTPException(
+            status_code=401, detail="Вы уже бронировали эту услугу."
+        )
 
     # Проверяем, чтобы пользователь не был владельцем объявления
-    service = db.reference(f"/services/{service_id}").get()
+    service = await get_service(service_id)
     if not service:
         raise HTTPException(
             status_code=404, detail="Услуга не найдена."
@@ -85,13 +91,9 @@ async def book_service(
     # Генерация идентификатора
     booking_id = shortuuid.uuid()
 
-    def check_id_unique(booking_id):
-        # Проверка существования идентификатора в базе данных
-        if db.reference(f"/booking_services/{booking_id}").get() is not None:
-            return check_id_unique(shortuuid.uuid())
-        return booking_id
-
-    booking_id = check_id_unique(booking_id)
+    # Проверка существования идентификатора в базе данных
+    while await get_booking(booking_id) is not None:
+        booking_id = shortuuid.uuid()
 
     # Сохранение информации о новой услуге в базу данных
     booking_data = {
@@ -107,28 +109,11 @@ async def book_service(
     if time is not None:
         booking_data["time"] = time
 
-    # Добавляем новую запись в Firebase Realtime Database
-    db.reference(f"/booked_services/{booking_id}").set(booking_data)
-
-    # Добавляем идентификатор бронирования в список booked_services пользователя
-    if "booked_services" not in user_data:
-        user_data["booked_services"] = []
-    user_data["booked_services"].append(booking_data)
-    user_ref.set(user_data)
+    # Сохраняем бронь и индексы пользователя, владельца и услуги одним обновлением
+    await save_booking(booking_data)
 
-    # Добавляем бронь в my_booked_services владельца услуги
-    owner_ref =  db.reference(f"/users/{service['owner_id']}")
-    owner_data = owner_ref.get()
-
-    # Проверяем есть ли у владельца массив с бронями, если нету создаём
-    if "my_booked_services" not in owner_data:
-        owner_data["my_booked_services"] = []
-
-    owner_data["my_booked_services"].append(booking_data)
-    
-    owner_data = await add_new_notification(owner_data, user_data["uid"], 'The user has booked a service')
-    
-    owner_ref.set(owner_data)
+    # Уведомляем владельца услуги
+    await push_notification(service['owner_id'], uid, 'The user has booked a service')
 
     return {"message": "Услуга успешно забронирована", "booking": booking_data}
 
@@ -139,46 +124,33 @@ async def book_service(
     description=services_documentation.get_user_booked_services
 )
 async def get_user_booked_services(current_user: dict = Depends(get_current_user)):
-    # Проверка на существование пользователя из токена
-    # Получаем данные текущего пользователя из Realtime Database
-    ref = db.reference(f'/users/{current_user["uid"]}')
-    user_data = ref.get()
-
-    if user_data is None:
-        raise HTTPException(status_code=403, detail="Недействительный токен")
+    # Получаем брони текущего пользователя по индексу
+    booked_services = await get_bookings(USER_BOOKINGS_PATH, current_user["uid"])
 
-    if 'booked_services' not in user_data:
+    if not booked_services:
         raise HTTPException(
             status_code=404, detail="Забронированных услуг не найдено")
 
-    booked_services = user_data['booked_services']
     data = []
 
-    for booking in booked_services:
-        # Получаем данные услуги
-        service_ref = db.reference(f'/services/{booking["service_id"]}')
-        service_data = service_ref.get()
+    # Получаем данные услуг и их владельцев пакетно
+    services = await get_services_by_ids([booking["service_id"] for booking in booked_services])
+    owners = await get_profiles(
+        service_data.get('owner_id') for service_data in services if service_data
+    )
 
+    for booking, service_data in zip(booked_services, services):
         if service_data is None:
-            # если услуга не найдена, удаляем её из списка забронированных услуг пользователя
-            booked_services.remove(booking)
-            ref.update({'booked_services': booked_services})
+            # если услуга не найдена, бронь не отдаётся
             continue
 
-        # Получаем данные владельца услуги
-        owner_id = service_data.get('owner_id')
-        if owner_id:
-            owner_ref = db.reference(f'/users/{owner_id}')
-            owner_data = owner_ref.get()
-        else:
-            owner_data = None
-
         # Формируем данные для ответа
         data.append({
             'service': service_data,
-            'owner': owner_data,
+            'owner': owners.get(service_data.get('owner_id')),
             'booking': booking
         })
+
     if len(data) < 1:
         raise HTTPException(
             status_code=404, detail="Забронированных услуг не найдено")
@@ -191,46 +163,31 @@ async def get_user_booked_services(current_user: dict = Depends(get_current_user
     description=services_documentation.get_booked_services
 )
 async def get_booked_services(current_user: dict = Depends(get_current_user)):
-    # Проверка на существование пользователя из токена
-    # Получаем данные текущего пользователя из Realtime Database
-    ref = db.reference(f'/users/{current_user["uid"]}')
-    user_data = ref.get()
-
-    if user_data is None:
-        raise HTTPException(status_code=403, detail="Недействительный токен")
+    # Получаем брони услуг текущего пользователя по индексу
+    my_booked_services = await get_bookings(OWNER_BOOKINGS_PATH, current_user["uid"])
 
-    if 'my_booked_services' not in user_data:
+    if not my_booked_services:
         raise HTTPException(
             status_code=404, detail="Забронированных услуг не найдено")
 
-    my_booked_services = user_data['my_booked_services']
     data = []
 
-    for booking in my_booked_services:
-        # Получаем данные услуги
-        service_ref = db.reference(f'/services/{booking["service_id"]}')
-        service_data = service_ref.get()
+    # Получаем данные услуг и забронировавших пользователей пакетно
+    services = await get_services_by_ids([booking["service_id"] for booking in my_booked_services])
+    bookers = await get_profiles(booking.get('user_id') for booking in my_booked_services)
 
+    for booking, service_data in zip(my_booked_services, services):
         if service_data is None:
-            # если услуга не найдена, удаляем её из списка забронированных услуг пользователя
-            my_booked_services.remove(booking)
-            ref.update({'my_booked_services': my_booked_services})
+            # если услуга не найдена, бронь не отдаётся
             continue
 
-        # Получаем данные владельца услуги
-        booker_id = booking['user_id']
-        if booker_id:
-            booker_ref = db.reference(f'/users/{booker_id}')
-            booker_data = booker_ref.get()
-        else:
-            booker_data = None
-
         # Формируем данные для ответа
         data.append({
             'service': service_data,
-            'owner': booker_data,
+            'owner': bookers.get(booking.get('user_id')),
             'booking': booking
         })
+
     if len(data) < 1:
         raise HTTPException(
             status_code=404, detail="Забронированных услуг не найдено")
@@ -253,41 +210,16 @@ async def cancel_booking(
     if not booking_id:
         raise HTTPException(status_code=422, detail="Id бронирования не указан.")
         
-    user_ref = db.reference(f"/users/{uid}")
-    user_data = user_ref.get()
-    if user_data is None:
-        raise HTTPException(status_code=403, detail="Неидентифицированный пользователь.")
-        
-    owner_id = None
-    # Проверяем есть ли у пользователя бронь данного сервиса
-    if "booked_services" in user_data:
-        for booking in user_data["booked_services"]:
-            if booking["id"] == booking_id:
-                owner_id = booking["service_owner_id"]
-                user_data["booked_services"].remove(booking)
-                break
-    
-    # Сохраняем изменения в базе данных Firebase
-    user_ref.set(user_data)
-    
-    if owner_id is not None:
-        owner_ref = db.reference(f'/users/{owner_id}')
-        owner_data = owner_ref.get()
-        if owner_data is not None and "my_booked_services" in owner_data:
-            for booking in owner_data["my_booked_services"]:
-                if booking["id"] == booking_id:
-                    owner_data["my_booked_services"].remove(booking)
-                    break
+    # Находим бронь и проверяем, что её сделал этот пользователь
+    booking = await get_booking(booking_id)
+    if booking is not None and booking["user_id"] == uid:
+        # Удаляем бронь и её индексы одним обновлением
+        await delete_booking(booking)
+
         # Отправляем уведомление владельцу, что бронь отменили
-        owner_data = await add_new_notification(owner_data, user_data["uid"], 'The user canceled the reservation')
+        await push_notification(booking["service_owner_id"], uid, 'The user canceled the reservation')
 
-        # Сохраняем изменения
-        owner_ref.set(owner_data)
     return {"message": "Бронирование успешнно удалено."}
-    try:
-        pass
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal Error: {e}")
 
 @router.put('/change_booking_status',
     summary="Изменение статуса забронированной услуги.",
@@ -310,31 +242,17 @@ async def change_booking_status(
     if not status:
         raise HTTPException(status_code=422, detail="Статус не указан.")
 
-    # Получаем данные пользователя
-    user_ref = db.reference(f"/users/{uid}")
-    user_data = user_ref.get()
+    # Получаем бронь
+    booking = await get_booking(booking_id)
 
-
-    if not user_data:
-        raise HTTPException(status_code=404, detail="Пользователь не найден.")
-
-    if "my_booked_services" not in user_data:
+    if not booking:
         raise HTTPException(status_code=404, detail="Забронированная усулга не найдена.")
 
-    for booking in user_data["my_booked_services"]:
-        if booking["id"] == booking_id:
-            # Проверяем чтобы пользователь был владельцем услуги
-            if booking["service_owner_id"] != uid:
-                raise HTTPException(status_code=403, detail="Пользователь не является владельцем.")
-            else:
-                # Сохраняем изменения
-                booking["status"] = status
-                break
-        # Ошибка вернётся если не было найдено бронь с таким booking_id у пользователя
+    # Проверяем чтобы пользователь был владельцем услуги
+    if booking["service_owner_id"] != uid:
         raise HTTPException(status_code=403, detail="Пользователь не является владельцем.")
 
-
     # Сохраняем изменения в базе данных
-    user_ref.set(user_data)
+    await update_booking(booking_id, {"status": status})
 
-    return {"message": "Статус изменён."}
\ No newline at end of file
+    return {"message": "Статус изменён."}
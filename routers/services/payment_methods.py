@@ -5,7 +5,8 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from firebase_admin import auth, db
 
-from schemas.services.payment_methods import PaymentMethodsResponse\
+from schemas.services.payment_methods import PaymentMethodsResponse
+from utils.firebase_db import db_get
 
 router = APIRouter()
 
@@ -15,8 +16,7 @@ router = APIRouter()
              response_model=List[PaymentMethodsResponse])
 async def get_all_payment_methods():
     # Получаем все способы оплаты
-    payment_methods_ref = db.reference("/payments_methods")
-    payment_methods_snapshot = payment_methods_ref.get()
+    payment_methods_snapshot = await db_get("/payments_methods")
     # Если данных не найдено
     if not payment_methods_snapshot:
         raise HTTPException(status_code=404, detail="Способов оплаты не найдено.")
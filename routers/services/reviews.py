@@ -34,22 +34,24 @@ from utils.services import (
     upload_service_image
 )
 from utils.location import get_location_name
+from utils.firebase_db import get_service, get_user, set_service
+from utils.profiles import get_profiles, save_user
 
 router = APIRouter()
 
 async def getReviewsWithReviewers(reviews):
     data_array = []
 
+    # Получаем профили всех авторов комментариев пакетно
+    reviewers = await get_profiles(review["reviewer_uid"] for review in reviews)
+
     for review in reviews:
-            
-        # Получаем данные пользователя добавившего комментарий
-        user_ref = db.reference(f'/users/{review["reviewer_uid"]}')
-        user_data = user_ref.get()
+        profile = reviewers.get(review["reviewer_uid"])
 
-        if user_data is not None:
+        if profile is not None:
             review["reviewer"] = {
-                "avatar": user_data["avatar"] or None,
-                "username": user_data["username"]
+                "avatar": profile.get("avatar") or None,
+                "username": profile.get("username")
             }
 
         # Добавляем объект в массив для отправки
@@ -65,8 +67,7 @@ async def get_service_reviews(
     service_id: str
 ):
     # Получаем услугу
-    service_ref = db.reference(f'/services/{service_id}')
-    service_data = service_ref.get()
+    service_data = await get_service(service_id)
 
     # Создаём пустой массив данных для отправки
     data_array = []
@@ -98,16 +99,14 @@ async def add_new_review(
         raise HTTPException(status_code=403, detail="Неавторизованный пользователь.")
     
     # Получаем данные пользователя
-    user_ref = db.reference(f'/users/{uid}')
-    user_data = user_ref.get()
+    user_data = await get_user(uid)
 
     # Проверка на существование пользователя
     if user_data is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
     # Получение услуги
-    service_ref = db.reference(f'/services/{service_id}')
-    service_data = service_ref.get()
+    service_data = await get_service(service_id)
 
     # Проверка на существование услуги
     if service_data is None:
@@ -137,7 +136,7 @@ async def add_new_review(
     
     service_data["reviews"].append(new_review)
 
-    service_ref.set(service_data)
+    await set_service(service_id, service_data)
 
     # Получаем массив с комментариями и информацией пользвоателя
     reviews_array = await getReviewsWithReviewers(service_data["reviews"])
@@ -148,6 +147,6 @@ async def add_new_review(
     user_data["last_active"] = date_now
 
     # Записываем обновленные данные в базу
-    user_ref.set(user_data)
+    await save_user(uid, user_data)
     
     return reviews_array
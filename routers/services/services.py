@@ -18,7 +18,6 @@ from fastapi import (
 )
 from datetime import datetime
 from typing import List, Optional
-from geopy.distance import geodesic
 
 from firebase_conf import firebase
 from documentation.services import services as services_documentation
@@ -29,99 +28,69 @@ from utils.services_categories import get_services_categories
 from utils.services import (
     get_payment_method,
     get_service_by_id,
+    get_services_by_ids,
     update_service_in_db,
     delete_service_from_db,
-    upload_service_image,
+    upload_service_images,
     remve_all_bookings_by_service_id
 )
-from utils.location import get_location_name
+from utils.images import IMAGE_VARIANTS
+from utils.uploads import release_pictures
+from utils.storage_gc import storage_gc
+from utils.location_enrichment import LOCATION_PENDING, location_enrichment
+from utils.firebase_db import get_service, get_user, set_service, set_user, update_user
+from utils.profiles import get_profile
+from utils.main import set_pagination_headers
+from utils.services_catalog import (
+    MAX_PAGE_LIMIT,
+    get_services_catalog,
+    services_catalog,
+)
 
 router = APIRouter()
 
 
-async def calculate_distance(lat1, lon1, lat2, lon2):
-    """
-    Рассчитывает расстояние между двумя географическими точками в километрах.
-
-    Args:
-        lat1 (float): Широта первой точки.
-        lon1 (float): Долгота первой точки.
-        lat2 (float): Широта второй точки.
-        lon2 (float): Долгота второй точки.
-
-    Returns:
-        float: Расстояние между точками в километрах.
-    """
-
-    # Создаем координаты точек
-    coords_1 = (lat1, lon1)
-    coords_2 = (lat2, lon2)
-
-    # Рассчитываем расстояние по большой окружности
-    return geodesic(coords_1, coords_2).kilometers
-
-
 @router.get(
     "/by_filters",
     summary="Получение услуг по фильтрам.",
     description=services_documentation.get_services_by_filters,
 )
-async def get_services_by_filters(filters: ServicesGetByFilters = Depends()):
+async def get_services_by_filters(
+    response: Response,
+    filters: ServicesGetByFilters = Depends(),
+):
     filters.to_int_fields()
-    py_db = firebase.database()
-
-    # Get services
-    services_ref = py_db.child("services").get()
-    services = services_ref.val() or {}
-
-    filtered_services = []
-    for service_id, service_data in services.items():
-        # Filter based on non-null and non-'null' filter values
-        include_service = True
-        if filters.category_id is not None and filters.category_id != "null":
-            include_service &= (
-                service_data.get("service_category_id",
-                                 None) == filters.category_id
-            )
-        if (
-            filters.payment_method_id is not None
-            and filters.payment_method_id != "null"
-        ):
-            include_service &= (
-                service_data.get("payment_method_id",
-                                 None) == filters.payment_method_id
-            )
-        if filters.minPrice is not None and filters.minPrice != "null":
-            service_price = service_data.get("price", None)
-            include_service &= (
-                service_price is not None and service_price >= filters.minPrice
-            )
-        if filters.maxPrice is not None and filters.maxPrice != "null":
-            service_price = service_data.get("price", None)
-            include_service &= (
-                service_price is not None and service_price <= filters.maxPrice
-            )
 
-        # Filter by location if lat, lon, and distance are provided
-        if (
-            include_service
-            and filters.lat is not None
-            and filters.lon is not None
-            and filters.distance is not None
-        ):
-            service_lat = service_data.get("lat", None)
-            service_lon = service_data.get("lon", None)
-            if service_lat is not None and service_lon is not None:
-                distance_km = await calculate_distance(
-                    filters.lat, filters.lon, service_lat, service_lon
-                )
-                include_service &= distance_km <= filters.distance
+    # Фильтры применяются к колоночному снимку услуг, а не к каждому словарю по очереди
+    catalog = await get_services_catalog()
+    rows = catalog.search(
+        category_id=filters.category_id,
+        payment_method_id=filters.payment_method_id,
+        min_price=filters.minPrice,
+        max_price=filters.maxPrice,
+        lat=filters.lat,
+        lon=filters.lon,
+        distance=filters.distance,
+        text=filters.name,
+    )
+
+    try:
+        rows, total, next_cursor = catalog.paginate(
+            rows,
+            sort=filters.sort or ("relevance" if filters.name else None),
+            descending=filters.order == "desc",
+            limit=min(filters.limit, MAX_PAGE_LIMIT) if filters.limit else None,
+            cursor=filters.cursor,
+            lat=filters.lat,
+            lon=filters.lon,
+            text=filters.name,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-        # Add service to filtered list if all conditions are met
-        if include_service:
-            filtered_services.append(service_data)
+    set_pagination_headers(response, total, next_cursor)
 
-    return filtered_services
+    return catalog.services_at(rows)
 
 
 @router.get(
@@ -131,12 +100,16 @@ async def get_services_by_filters(filters: ServicesGetByFilters = Depends()):
     response_model=List[ServiceSchema],
 )
 async def get_services(
+    response: Response,
     id: Optional[str] = Query(None, description="ID сервиса для фильтрации"),
+    limit: Optional[int] = Query(None, ge=1, description="Количество услуг на странице"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы"),
+    sort: Optional[str] = Query(None, description="Поле сортировки: price, created_at, rating_count"),
+    order: Optional[str] = Query("asc", description="Порядок сортировки: asc или desc"),
 ):
     # Если указан id, находим и возвращаем услугу по id
     if id is not None:
-        ref = db.reference(f"/services/{id}")
-        data = ref.get()
+        data = await get_service(id)
 
         if not data:
             raise HTTPException(
@@ -145,26 +118,31 @@ async def get_services(
         
         # Получаем данные владельца услуги
         owner_id = data.get('owner_id')
-        owner_data = None
-        if owner_id:
-            owner_ref = db.reference(f'/users/{owner_id}')
-            owner_data = owner_ref.get()
-        
-        data["owner"] = owner_data
+        data["owner"] = await get_profile(owner_id)
 
         return [data]
 
-    # Получаем ссылку на узел услуг
-    ref = db.reference("/services")
-    data = ref.get()
+    # Получаем все услуги из снимка каталога
+    catalog = await get_services_catalog()
+    rows = catalog.search()
 
-    if not data:
+    if not len(rows):
         raise HTTPException(status_code=404, detail="Услуги не найдены.")
 
-    # Преобразуем данные в список
-    services = list(data.values())
+    try:
+        rows, total, next_cursor = catalog.paginate(
+            rows,
+            sort=sort,
+            descending=order == "desc",
+            limit=min(limit, MAX_PAGE_LIMIT) if limit else None,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    return services
+    set_pagination_headers(response, total, next_cursor)
+
+    return catalog.services_at(rows)
 
 @router.post(
     "/by_ids_array",
@@ -178,17 +156,8 @@ async def by_ids_array(request: Request):
     if ids is None or len(ids) < 1:
         raise HTTPException(status_code=422, detail="Id услуг не указаны.")
 
-    services = []
-
-    # Пробегаемся по массиву id услуг
-    for service_id in ids:
-        ref = db.reference(f"/services/{service_id}")
-        data = ref.get()
-
-        # Добавляем в массив
-        services.append(data)
-
-    return services
+    # Услуги берутся из локального каталога, недостающие дочитываются параллельно
+    return await get_services_by_ids(ids)
 
 
 @router.post(
@@ -234,27 +203,13 @@ async def add_new_service(
     # Генерация уникального идентификатора для нового сервиса
     service_id = shortuuid.uuid()
 
-    def check_id_unique(service_id):
-        # Проверка существования идентификатора в базе данных
-        if db.reference(f"/services/{service_id}").get() is not None:
-            return check_id_unique(shortuuid.uuid())
-        return service_id
-
-    service_id = check_id_unique(service_id)
+    # Проверка существования идентификатора в базе данных
+    while await get_service(service_id) is not None:
+        service_id = shortuuid.uuid()
 
     if pictures:
-        # Загрузка картинок в Firebase Storage
-        picture_urls = []
-        for picture in pictures:
-            # Чтение содержимого файла
-            picture.file.seek(0)
-            res_content = picture.file.read()
-
-            # Загрузка файла и получение URL-адреса
-            new_image_url = await upload_service_image(res_content, service_id, picture.content_type)
-            picture_urls.append(new_image_url)
-    
-    location_name = await get_location_name(lat, lon)
+        # Параллельная загрузка картинок и их уменьшенных вариантов в Firebase Storage
+        picture_variants = await upload_service_images(pictures)
 
     # Сохранение информации о новой услуге в базу данных
     service_data = {
@@ -271,28 +226,36 @@ async def add_new_service(
         "owner_id": uid,
         "is_store": False,
         "service_category_id": service_category_id,
-        "location_name":location_name,
+        # Адрес определяется в фоне и дописывается в услугу позже
+        "location_name": LOCATION_PENDING,
         "start_time": start_time,
         "end_time": end_time,
         "created_at": datetime.now().isoformat(),
     }
 
     if pictures:
-        service_data["pictures"] = picture_urls
+        service_data["pictures"] = [picture["full"] for picture in picture_variants]
+        service_data["pictures_variants"] = picture_variants
     # Если имеются время работы то добавляем их
     if payment_method_id:
         service_data["payment_method_id"] = payment_method_id
 
     # Добавляем новую запись в Firebase Realtime Database
-    db.reference(f"/services/{service_id}").set(service_data)
+    try:
+        await set_service(service_id, service_data)
+    except Exception:
+        # Услуга не сохранена - снимаем ссылки с загруженных для неё картинок
+        await release_pictures(service_data.get("pictures", []))
+        raise
+    services_catalog.upsert(service_data)
+    location_enrichment.enqueue(service_id, lat, lon)
 
     # Обновление данных пользователя
-    user_ref = db.reference(f"/users/{uid}")
-    user_data = user_ref.get()
+    user_data = await get_user(uid)
     if "services" not in user_data:
         user_data["services"] = []
     user_data["services"].append(service_id)
-    user_ref.set(user_data)
+    await set_user(uid, user_data)
 
     return {"message": "Услуга успешно добавлена", "service": service_data}
 
@@ -328,8 +291,10 @@ async def update_service(
         raise HTTPException(
             status_code=403, detail="У вас нет прав для обновления этого сервиса."
         )
-    
-    location_name = await get_location_name(lat, lon)
+
+    # Если место не изменилось, сохраняем уже известный адрес, иначе определяем его в фоне
+    location_changed = service.get("lat") != lat or service.get("lon") != lon
+    location_name = LOCATION_PENDING if location_changed else service.get("location_name", LOCATION_PENDING)
 
     # Обновляем данные сервиса, которые были переданы в запросе
     updated_data = {
@@ -351,42 +316,50 @@ async def update_service(
         "end_time": end_time
     }
 
-    picture_urls = []
+    picture_variants = []
+    removed_pictures = []
 
-    bucket = storage.bucket()
     current_pictures = service.get("pictures", [])
-
-    # Проверка и удаление старых картинок которых нету в old_pictures
-    for picture_url in current_pictures:
-        if old_pictures:
-            if picture_url not in old_pictures:    
-                blob = bucket.blob(f'services/{service_id}/' + picture_url.split('/')[-1])
-                blob.delete()
-            else:
-                # Сохраняем адреса картинок которые не были удалены
-                picture_urls.append(picture_url)
+    current_variants = service.get("pictures_variants", [])
+
+    # Проверка старых картинок которых нету в old_pictures
+    for index, picture_url in enumerate(current_pictures):
+        if old_pictures and picture_url not in old_pictures:
+            removed_pictures.append(picture_url)
+        elif index < len(current_variants):
+            # Сохраняем адреса картинок которые не были удалены
+            picture_variants.append(current_variants[index])
         else:
-            picture_urls.append(picture_url)
+            # У картинок, загруженных до появления вариантов, все варианты - оригинал
+            picture_variants.append({name: picture_url for name in IMAGE_VARIANTS})
 
     # Добавление новых картинок
+    uploaded_variants = []
     if new_pictures:
-        for picture in new_pictures:
-            # Чтение содержимого файла
-            picture.file.seek(0)
-            res_content = picture.file.read()
+        uploaded_variants = await upload_service_images(new_pictures)
+        picture_variants += uploaded_variants
 
-            # Загрузка файла и получение URL-адреса
-            new_image_url = await upload_service_image(res_content, service_id, picture.content_type)
-            picture_urls.append(new_image_url)
-
-    updated_data['pictures'] = picture_urls
+    updated_data['pictures'] = [picture["full"] for picture in picture_variants]
+    updated_data['pictures_variants'] = picture_variants
 
     # Если имеются время работы то добавляем их
     if payment_method_id:
         updated_data["payment_method_id"] = payment_method_id
 
     # Обновляем сервис в базе данных
-    await update_service_in_db(service_id, updated_data)
+    try:
+        await update_service_in_db(service_id, updated_data)
+    except Exception:
+        # Услуга не обновлена - снимаем ссылки с только что загруженных картинок
+        await release_pictures([picture["full"] for picture in uploaded_variants])
+        raise
+    services_catalog.upsert({**service, **updated_data})
+
+    # Снимаем ссылки с удалённых картинок, файлы удаляются когда на них больше никто не ссылается
+    await release_pictures(removed_pictures)
+
+    if location_changed or location_name == LOCATION_PENDING:
+        location_enrichment.enqueue(service_id, lat, lon)
 
     return {
         "message": "Сервис успешно обновлен",
@@ -420,31 +393,25 @@ async def delete_service(
             status_code=403, detail="У вас нет прав для удаления этого сервиса."
         )
 
-    # Удаляем папку с картинками, связанные с услугой
-    bucket = storage.bucket()
-    blobs = bucket.list_blobs(prefix=f"services/{service_id}")
-    for blob in blobs:
-        blob.delete()
+    # Папка с картинками услуги удаляется в фоне
+    storage_gc.enqueue_prefix(f"services/{service_id}/")
+
+    # Снимаем ссылки с картинок услуги, которые хранятся по хэшу содержимого
+    await release_pictures(service.get("pictures", []))
 
     # Удаляем сервис из базы данных
     await delete_service_from_db(service_id)
+    services_catalog.remove(service_id)
 
     # Обновление данных пользователя
-    user_ref = db.reference(f"/users/{uid}")
-    user_data = user_ref.get()
+    user_data = await get_user(uid)
     if "services" in user_data:
         user_data["services"].remove(service_id)
 
-    # Удаляем услугу из забронированных услуг у пользователя
-    if "my_booked_services" in user_data:
-        for book in user_data["my_booked_services"]:
-            if book["service_id"] == service_id:
-                user_data["my_booked_services"].remove(book)
-
     # Сохраняем изменения                
-    user_ref.set(user_data)
+    await set_user(uid, user_data)
 
-    # Находим и удаляем брони данной услуги у всех пользователей кто забронировал услугу
+    # Находим и удаляем брони данной услуги вместе с индексами забронировавших и владельца
     users_ids = await remve_all_bookings_by_service_id(service_id)
 
     # Создаём сообщение для уведомелния
@@ -453,8 +420,7 @@ async def delete_service(
     # Отправляем сообщение пользователям
     for user_uid in users_ids:
         # Получаем данные пользователя
-        u_ref = db.reference(f"/users/{user_uid}")
-        u_data = u_ref.get()
+        u_data = await get_user(user_uid)
         # Добавляем уведомление
         if "notifications" not in u_data:
             u_data["notifications"] = []
@@ -470,7 +436,7 @@ async def delete_service(
 
         u_data["notifications"].append(new_notification)
 
-        u_ref.set(u_data)
+        await set_user(user_uid, u_data)
 
     return {"message": "Сервис успешно удален"}
 
@@ -487,19 +453,17 @@ async def get_my_services(
             status_code=401, detail="Неиндентифицированный пользователь."
         )
 
-    py_db = firebase.database()
-
-    # Получение данных из Firebase
-    services_ref = py_db.child("services").order_by_child("owner_id").equal_to(uid).get()
+    # Получение услуг пользователя из локального каталога
+    catalog = await get_services_catalog()
+    services = catalog.owner_services(uid)
 
-    if not services_ref.val():
+    if not services:
         raise HTTPException(
             status_code=404, detail="Услуги не найдены."
         )
 
-    # Преобразование данных в список и сортировка в обратном порядке
-    services = list(services_ref.val().values())
-    services.reverse()
+    # Сортировка по id в обратном порядке, как отдавал Firebase
+    services.sort(key=lambda service: service.get("id", ""), reverse=True)
 
     return services
 
@@ -523,8 +487,7 @@ async def like_service_event(
         
     # Проверяем существует ли услуга
 
-    service_ref = db.reference(f'/services/{service_id}')
-    service_data = service_ref.get()
+    service_data = await get_service(service_id)
         
     if service_data is None:
         raise HTTPException(status_code=404, detail="Услуга не найден.")
@@ -534,8 +497,7 @@ async def like_service_event(
         raise HTTPException(status_code=402, detail="Владелец не может лайкать своё объявление.")
 
     # Получаем данные пользователя
-    user_ref = db.reference(f"/users/{uid}")
-    user_data = user_ref.get()
+    user_data = await get_user(uid)
 
     # Проверяем есть ли массив с лайками услуг у пользователя, создаём если нету
     if "liked_services" not in user_data:
@@ -554,7 +516,7 @@ async def like_service_event(
         res_status_code = 201
         res_text = "Лайк успешно зарегестрирован."
 
-    user_ref.update(user_data)
+    await update_user(uid, user_data)
 
     return Response(
         status_code=res_status_code,
@@ -19,6 +19,8 @@ from utils.user import update_last_active, upload_user_avatar
 from schemas.sms import *
 from documentation.users import auth as authorization_documentation
 from utils.user import get_current_user
+from utils.firebase_db import run_db, get_user, set_user, update_user
+from utils.profiles import save_public_profile, save_user
 
 router = APIRouter()
 
@@ -41,8 +43,7 @@ def verify_password(plain_password, hashed_password):
             description="Описание защищенного маршрута")
 async def protected_route(current_user: dict = Depends(get_current_user)):
     # Получаем ссылку на узел пользователей
-    ref = db.reference(f'users/{current_user["uid"]}')
-    user_data = ref.get()
+    user_data = await get_user(current_user["uid"])
 
     if not user_data:
         raise HTTPException(status_code=404, detail="Пользователь не найден.")
@@ -91,7 +92,7 @@ async def register_with_email(data: User):
         user_data_dict["username"] = data.username
 
         # сохранение всех данных в realtime database
-        db.reference("users").child(user.uid).set(user_data_dict)
+        await save_user(user.uid, user_data_dict)
 
         # получение экземпляра аутентификации
         py_auth = firebase.auth()
@@ -125,7 +126,7 @@ async def auth_with_phone(data: User):
             raise HTTPException(status_code=422, detail="Номер не указан.")
 
         # Проверяем, существует ли аккаунт пользователя в узле users/uid в Realtime Database
-        user_ref = db.reference("users").order_by_child("phone_number").equal_to(data.phone_number).get()
+        user_ref = await run_db(db.reference("users").order_by_child("phone_number").equal_to(data.phone_number).get)
 
         # Если аккаунт с указанным номером телефона существует, возвращаем сообщение
         if user_ref:
@@ -143,7 +144,7 @@ async def auth_with_phone(data: User):
         user_data_dict["username"] = data.username
 
         # Сохранение всех данных в Realtime Database
-        db.reference("users").child(user_record.uid).set(user_data_dict)
+        await save_user(user_record.uid, user_data_dict)
 
         # Возврат сообщения об успешной регистрации
         return {"message": "Аккаунт успешно зарегистрирован."}
@@ -188,7 +189,7 @@ async def auth_with_google(data: GoogleAccountUser):
         user_data_dict['last_active'] = datetime.now().isoformat()
 
         # Проверяем, существует ли пользователь
-        existing_user_data = db.reference("users").child(data.uid).get()
+        existing_user_data = await get_user(data.uid)
 
         
         # Скачиваем изображение и загружаем его в Firebase Storage (Заборожен)
@@ -214,15 +215,18 @@ async def auth_with_google(data: GoogleAccountUser):
             if 'role' in existing_user_data:
                 updates['role'] = existing_user_data.get('role')
 
-            db.reference("users").child(data.uid).update(updates)
+            await update_user(data.uid, updates)
         # Иначе создаем нового пользователя с ролью "buyer"
         else:
             user_data_dict['created_at'] = datetime.now().isoformat()
             user_data_dict['role'] = 'buyer'  # Присваиваем роль по умолчанию
-            db.reference("users").child(data.uid).set(user_data_dict)
+            await set_user(data.uid, user_data_dict)
 
         # Получаем обновленные данные пользователя из базы данных
-        updated_user_data = db.reference("users").child(data.uid).get()
+        updated_user_data = await get_user(data.uid)
+
+        # Обновляем публичный профиль пользователя
+        await save_public_profile(data.uid, updated_user_data)
 
         return {"message": "Данные пользователя успешно обновлены", "user": updated_user_data}
 
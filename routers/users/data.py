@@ -30,6 +30,9 @@ from config import BASE_DIR
 from documentation.users import data as user_documentation
 from schemas.user import *
 from utils.user import get_current_user, update_last_active, upload_user_avatar_with_file, delete_picture_from_storage
+from utils.uploads import release_picture
+from utils.firebase_db import db_get_many, db_update, get_user
+from utils.profiles import save_user
 
 
 router = APIRouter()
@@ -67,15 +70,14 @@ async def change_user_location(
 
     try:
         # Получение пользователя
-        user_ref = db.reference(f'users/{current_user["uid"]}')
-        user = user_ref.get()
+        user = await get_user(current_user["uid"])
 
         if not user:
             raise HTTPException(
                 status_code=404, detail="Пользователь не найден.")
 
         # Обновляем или создаем локацию
-        user_ref.update({"location": {"lat": float(lat), "lon": float(lon)}})
+        await db_update(f'users/{current_user["uid"]}', {"location": {"lat": float(lat), "lon": float(lon)}})
 
         return {"message": "Локация пользователя обновлена."}
 
@@ -107,8 +109,7 @@ async def update_user(
             )
 
         # Получаем данные пользователя из Realtime Database
-        user_ref = db.reference(f"users/{uid}")
-        user_data = user_ref.get()
+        user_data = await get_user(uid)
 
         update_status = {
             "username": "no",
@@ -126,16 +127,15 @@ async def update_user(
             update_status["username"] = "Имя не указано."
 
         if avatar:
-            # Если у пользователя была картинка, удаляем её
-            if user_data.get("avatar"):
-                await delete_picture_from_storage(user_data["avatar"])
+            # Загрузка аватара и его уменьшенных вариантов
+            avatar_variants = await upload_user_avatar_with_file(avatar)
 
-            # Чтение содержимого файла
-            avatar.file.seek(0)
-            res_content = avatar.file.read()
+            # Если у пользователя была картинка, снимаем ссылку на неё
+            if user_data.get("avatar"):
+                await release_picture(user_data["avatar"])
 
-            user_avatar_url = await upload_user_avatar_with_file(res_content, uid, avatar.content_type)
-            user_data["avatar"] = user_avatar_url
+            user_data["avatar"] = avatar_variants["full"]
+            user_data["avatar_variants"] = avatar_variants
             update_status["avatar"] = "success"
 
         py_auth = firebase.auth()
@@ -175,7 +175,7 @@ async def update_user(
 
 
         # Записываем обновленные данные в базу
-        user_ref.set(user_data)
+        await save_user(uid, user_data)
 
         return update_status
     except HTTPException as e:
@@ -298,11 +298,8 @@ async def get_users_by_filters(
 )
 async def getUserById(uid: str):
     try:
-        # Получаем ссылку на узел пользователей
-        ref = db.reference(f"/users/{uid}")
-
         # Получаем данные пользователя
-        user_data = ref.get()
+        user_data = await get_user(uid)
 
         if user_data is None:
             raise HTTPException(
@@ -333,14 +330,11 @@ async def get_users_by_id_array(request: Request):
         # Инициализируем пустой список для хранения данных пользователей
         users_data = []
 
-        # Проходим по списку uids
-        for user_id in uids:
-            # Получаем ссылку на узел пользователя
-            ref = db.reference(f"/users/{user_id}")
-
-            # Получаем данные пользователя
-            user_data = ref.get()
+        # Получаем данные всех пользователей параллельно
+        users = await db_get_many(f"/users/{user_id}" for user_id in uids)
 
+        # Проходим по списку пользователей
+        for user_data in users:
             if user_data is None:
                 continue
 
@@ -376,16 +370,14 @@ async def likeUserEvent(
 
         # Пользователь с префиксом U_ это тот кого добавляют или удаляют из лайков
         # Проверка на существования пользователя по отправленному uid
-        u_ref = db.reference(f"/users/{uid}")
-        u_user_data = u_ref.get()
+        u_user_data = await get_user(uid)
 
         if u_user_data is None:
             raise HTTPException(
                 status_code=404, detail="Пользователь не найден")
 
         # Получаем данные текущего пользователя из Realtime Database
-        ref = db.reference(f'/users/{current_user["uid"]}')
-        user_data = ref.get()
+        user_data = await get_user(current_user["uid"])
 
         if user_data is None:
             raise HTTPException(
@@ -410,7 +402,7 @@ async def likeUserEvent(
             res_text = "Пользователь добавлен в лайки"
 
         # Обновляем данные пользователя в базе данных
-        ref.update(user_data)
+        await db_update(f'/users/{current_user["uid"]}', user_data)
         
         return Response(
             status_code=res_status_code,
@@ -433,8 +425,7 @@ async def save_workgin_days(
         uid = request_data.get('uid')
         working_week_days = request_data.get('working_week_days')
 
-        user_ref = db.reference(f'users/{current_user["uid"]}')
-        user_data = user_ref.get()
+        user_data = await get_user(current_user["uid"])
 
         if not uid or uid != current_user["uid"] or not user_data:
             raise HTTPException(status_code=403, detials="Неидентифицированный пользователь.")
@@ -483,7 +474,7 @@ async def save_workgin_days(
                 })
             
         user_data["working_week_days"] = data
-        user_ref.update(user_data)
+        await db_update(f'users/{current_user["uid"]}', user_data)
 
 
         return Response(
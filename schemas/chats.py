@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+
+class ChatMessageSchema(BaseModel):
+    id: str
+    sender_id: str
+    text: str
+    timestamp: str
+    # Для каждой картинки словарь URL вариантов thumbnail, card и full
+    pictures: Optional[List[Dict[str, str]]] = None
+
+
+class ChatHeaderSchema(BaseModel):
+    chat_id: str
+    last_action: str
+    last_action_date: str
+    users: Dict[str, dict]
+    # Публичный профиль собеседника
+    companion: Optional[dict] = None
+    # Количество непрочитанных сообщений в чате
+    unread: int = 0
+
+
+class UnreadTotalSchema(BaseModel):
+    unread_total: int
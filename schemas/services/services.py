@@ -29,6 +29,10 @@ class ServicesGetByFilters(BaseModel):
     lon: Optional[str] = None
     distance: Optional[str] = None
     name: Optional[str] = None
+    limit: Optional[str] = None
+    cursor: Optional[str] = None
+    sort: Optional[str] = None
+    order: Optional[str] = None
 
     def to_int_fields(self):
         # Преобразование полей в целые числа, если они не None и могут быть преобразованы
@@ -42,6 +46,14 @@ class ServicesGetByFilters(BaseModel):
             self.payment_method_id) if self.payment_method_id and self.payment_method_id != 'null' and self.payment_method_id.isdigit() else None
         self.distance = int(
             self.distance) if self.distance and self.distance != 'null' and self.distance.isdigit() else None
+        self.limit = int(
+            self.limit) if self.limit and self.limit != 'null' and self.limit.isdigit() else None
+
+        # Пустые строковые параметры пагинации и сортировки приводим к None
+        self.name = self.name.strip() if self.name and self.name != 'null' else None
+        self.cursor = self.cursor if self.cursor and self.cursor != 'null' else None
+        self.sort = self.sort if self.sort and self.sort != 'null' else None
+        self.order = self.order if self.order and self.order != 'null' else None
 
         # Преобразование полей в числа с плавающей точкой, если они не None и могут быть преобразованы
         self.lat = float(self.lat) if self.lat and self.lat != 'null' and self.lat.replace(
@@ -78,6 +90,7 @@ class ServiceSchema(BaseModel):
     is_active: bool
     date: Optional[int] = None
     pictures: Optional[list] = None
+    pictures_variants: Optional[list] = None
     service_category_id: int
     payment_method_id: Optional[int] = None
     reviews: Optional[list] = None
@@ -0,0 +1,167 @@
+from utils.firebase_db import db_claim, db_get, db_get_many, db_set, db_update_paths
+
+# Брони хранятся только в /booked_services/{booking_id}, остальные узлы - индексы id:
+# bookings_by_service/{service_id}/{booking_id} = uid забронировавшего
+BOOKINGS_BY_SERVICE_PATH = "bookings_by_service"
+# user_bookings/{uid}/{booking_id} = service_id - брони пользователя
+USER_BOOKINGS_PATH = "user_bookings"
+# owner_bookings/{uid}/{booking_id} = service_id - брони услуг владельца
+OWNER_BOOKINGS_PATH = "owner_bookings"
+# Отметка о переносе броней из документов пользователей в индексы
+BOOKINGS_MIGRATION_PATH = "migrations/normalized_bookings"
+
+
+def service_booking_path(service_id, booking_id):
+    return f"/{BOOKINGS_BY_SERVICE_PATH}/{service_id}/{booking_id}"
+
+
+def booking_paths(booking, value):
+    """
+    Возвращает многопутевое обновление записи брони и всех её индексов.
+
+    Args:
+        booking: Данные брони.
+        value: booking для сохранения брони или None для её удаления.
+
+    Returns:
+        Словарь {путь: значение} для db_update_paths.
+    """
+
+    booking_id = booking["id"]
+    service_id = booking["service_id"]
+    indexed = value is not None
+
+    return {
+        f"/booked_services/{booking_id}": value,
+        service_booking_path(service_id, booking_id): booking["user_id"] if indexed else None,
+        f"/{USER_BOOKINGS_PATH}/{booking['user_id']}/{booking_id}": service_id if indexed else None,
+        f"/{OWNER_BOOKINGS_PATH}/{booking['service_owner_id']}/{booking_id}": service_id if indexed else None,
+    }
+
+
+async def save_booking(booking):
+    # Атомарно сохраняет бронь вместе с индексами
+    await db_update_paths(booking_paths(booking, booking))
+
+
+async def delete_booking(booking):
+    # Атомарно удаляет бронь вместе с индексами
+    await db_update_paths(booking_paths(booking, None))
+
+
+async def get_bookings(index_path, uid):
+    """
+    Возвращает брони пользователя по индексу user_bookings или owner_bookings.
+
+    Записи индекса, для которых брони уже нет, удаляются из индекса.
+
+    Args:
+        index_path: USER_BOOKINGS_PATH или OWNER_BOOKINGS_PATH.
+        uid: Id пользователя.
+
+    Returns:
+        Список броней в порядке создания.
+    """
+
+    index = await db_get(f"/{index_path}/{uid}") or {}
+    bookings_ids = list(index)
+    bookings = await db_get_many(f"/booked_services/{booking_id}" for booking_id in bookings_ids)
+
+    stale = {
+        f"/{index_path}/{uid}/{booking_id}": None
+        for booking_id, booking in zip(bookings_ids, bookings)
+        if booking is None
+    }
+    if stale:
+        await db_update_paths(stale)
+
+    bookings = [booking for booking in bookings if booking is not None]
+    bookings.sort(key=lambda booking: booking.get("booked_at", ""))
+    return bookings
+
+
+async def has_booked_service(uid, service_id):
+    # Проверяет, есть ли у пользователя бронь услуги, по индексу брони услуги
+    index = await db_get(f"/{BOOKINGS_BY_SERVICE_PATH}/{service_id}") or {}
+    return uid in index.values()
+
+
+async def migrate_bookings():
+    """
+    Однократно переносит брони из документов пользователей в индексы.
+
+    Раньше бронь копировалась в массивы booked_services забронировавшего и
+    my_booked_services владельца. Актуальными считаются брони из этих массивов,
+    статус берётся из копии владельца. Брони и записи индексов добавляются по
+    отдельным путям, чтобы не затронуть уже созданные через новый код, а массивы
+    удаляются из документов пользователей в том же многопутевом обновлении.
+    Миграцию выполняет только воркер, первым поставивший отметку.
+    """
+
+    if not await db_claim(f"/{BOOKINGS_MIGRATION_PATH}"):
+        return
+
+    try:
+        users = await db_get("/users") or {}
+        if isinstance(users, list):
+            users = {user["uid"]: user for user in users if user}
+
+        bookings = {}
+        updates = {}
+
+        for uid, user in users.items():
+            for booking in user.get("booked_services") or []:
+                if booking and booking.get("id"):
+                    bookings.setdefault(booking["id"], booking)
+            if "booked_services" in user:
+                updates[f"/users/{uid}/booked_services"] = None
+
+        for uid, user in users.items():
+            for booking in user.get("my_booked_services") or []:
+                if booking and booking.get("id") in bookings:
+                    bookings[booking["id"]] = {**bookings[booking["id"]], **booking}
+            if "my_booked_services" in user:
+                updates[f"/users/{uid}/my_booked_services"] = None
+
+        for booking in bookings.values():
+            updates.update(booking_paths(booking, booking))
+
+        if updates:
+            await db_update_paths(updates)
+    except Exception:
+        # Снимаем отметку, чтобы миграция повторилась при следующем запуске
+        await db_set(f"/{BOOKINGS_MIGRATION_PATH}", False)
+        raise
+
+
+async def remove_service_bookings(service_id):
+    """
+    Удаляет все брони услуги вместе с их индексами.
+
+    Брони находятся по индексу bookings_by_service, изменения записываются
+    одним многопутевым обновлением.
+
+    Args:
+        service_id: Id удаляемой услуги.
+
+    Returns:
+        Список id пользователей, у которых были удалены брони.
+    """
+
+    index = await db_get(f"/{BOOKINGS_BY_SERVICE_PATH}/{service_id}") or {}
+    bookings_ids = list(index)
+    bookings = await db_get_many(f"/booked_services/{booking_id}" for booking_id in bookings_ids)
+
+    updates = {f"/{BOOKINGS_BY_SERVICE_PATH}/{service_id}": None}
+    for booking_id, booking in zip(bookings_ids, bookings):
+        if booking is None:
+            updates[f"/{USER_BOOKINGS_PATH}/{index[booking_id]}/{booking_id}"] = None
+            continue
+        paths = booking_paths(booking, None)
+        # Узел брони услуги удаляется целиком, вложенные пути в том же обновлении недопустимы
+        paths.pop(service_booking_path(service_id, booking_id))
+        updates.update(paths)
+
+    await db_update_paths(updates)
+
+    return list(dict.fromkeys(index.values()))
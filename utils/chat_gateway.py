@@ -0,0 +1,137 @@
+import asyncio
+import contextlib
+import json
+import os
+
+from utils.firebase_db import CHAT_META_PATH, db_get
+
+# Если указан адрес Redis, события чатов рассылаются через него всем воркерам
+REDIS_URL = os.getenv("REDIS_URL")
+# Канал Redis с событиями чатов
+CHAT_EVENTS_CHANNEL = "chat_events"
+# Сколько секунд ждать отправки одного события клиенту, прежде чем закрыть подключение
+CHAT_SEND_TIMEOUT = float(os.getenv("CHAT_SEND_TIMEOUT", 10))
+# Сколько неотправленных событий может накопиться у подключения, прежде чем оно закроется
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", 100))
+
+
+class ChatGateway:
+    """
+    Рассылка событий чатов по WebSocket-подключениям.
+
+    Подключения регистрируются по uid пользователя, поэтому пользователь
+    получает события всех своих чатов, включая созданные после подключения.
+    Без Redis события доставляются только подключениям этого процесса, с Redis
+    публикуются в канал и каждый воркер доставляет их своим подключениям.
+
+    У каждого подключения своя очередь и задача отправки, поэтому медленный
+    клиент не задерживает ответ на запрос и доставку остальным. Подключение,
+    которое не принимает события дольше CHAT_SEND_TIMEOUT или накопило больше
+    CHAT_SEND_QUEUE_SIZE событий, закрывается.
+    """
+
+    def __init__(self, redis_url=REDIS_URL):
+        self.redis_url = redis_url
+        self._connections = {}
+        self._redis = None
+        self._listener = None
+
+    async def start(self):
+        if not self.redis_url:
+            return
+
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(self.redis_url, decode_responses=True)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        senders = [sender for connections in self._connections.values() for _, sender in connections.values()]
+        for sender in senders:
+            sender.cancel()
+        await asyncio.gather(*senders, return_exceptions=True)
+
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def connect(self, uid, websocket):
+        # Подключения пользователя: {websocket: (очередь событий, задача отправки)}
+        queue = asyncio.Queue()
+        sender = asyncio.create_task(self._send(uid, websocket, queue))
+        self._connections.setdefault(uid, {})[websocket] = (queue, sender)
+
+    def disconnect(self, uid, websocket):
+        connections = self._connections.get(uid)
+        if connections is None:
+            return
+        connection = connections.pop(websocket, None)
+        if not connections:
+            del self._connections[uid]
+
+        if connection is not None and connection[1] is not asyncio.current_task():
+            connection[1].cancel()
+
+    async def _send(self, uid, websocket, queue):
+        try:
+            while True:
+                event = await queue.get()
+                await asyncio.wait_for(websocket.send_json(event), CHAT_SEND_TIMEOUT)
+        except Exception:
+            # Клиент закрыл подключение или не принимает события
+            pass
+        finally:
+            self.disconnect(uid, websocket)
+            # Закрываем подключение, чтобы завершился и обработчик WebSocket;
+            # уже закрытое клиентом подключение повторно не закрывается
+            with contextlib.suppress(Exception):
+                await asyncio.wait_for(websocket.close(), CHAT_SEND_TIMEOUT)
+
+    async def publish_to_chat(self, chat_id, event):
+        # Отправляет событие всем участникам чата
+        users = await db_get(f"/{CHAT_META_PATH}/{chat_id}/users", shallow=True) or {}
+        await self.publish(list(users), {"chat_id": chat_id, **event})
+
+    async def publish(self, users_ids, event):
+        if self._redis is not None:
+            try:
+                await self._redis.publish(
+                    CHAT_EVENTS_CHANNEL, json.dumps({"users": users_ids, "event": event})
+                )
+                return
+            except Exception as e:
+                print(f"Ошибка публикации события чата в Redis: {e}")
+
+        await self._deliver(users_ids, event)
+
+    async def _deliver(self, users_ids, event):
+        # Событие только ставится в очереди подключений, отправляют их задачи подключений
+        for uid in users_ids:
+            for websocket, (queue, _) in list(self._connections.get(uid, {}).items()):
+                if queue.qsize() >= CHAT_SEND_QUEUE_SIZE:
+                    self.disconnect(uid, websocket)
+                else:
+                    queue.put_nowait(event)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CHAT_EVENTS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message.get("type") != "message":
+                            continue
+                        data = json.loads(message["data"])
+                        await self._deliver(data["users"], data["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка подписки на события чатов: {e}")
+                await asyncio.sleep(1)
+
+
+chat_gateway = ChatGateway()
@@ -1,13 +1,67 @@
 import datetime
+import os
 import shortuuid
 
 from firebase_admin import db, storage
 
+from utils.firebase_db import (
+    db_claim,
+    db_get,
+    db_get_last,
+    db_get_many,
+    db_push,
+    db_set,
+    db_transaction,
+    db_update_paths,
+    increment,
+    CHAT_MESSAGES_PATH,
+    CHAT_META_PATH,
+    get_user,
+    push_chat_message,
+    set_user,
+)
+from utils.chat_gateway import chat_gateway
+from utils.images import IMAGE_VARIANTS
+from utils.profiles import get_profiles
+from utils.uploads import release_pictures, upload_picture, upload_pictures
+
+# Индекс чатов по паре собеседников: chat_pairs/{меньший uid}_{больший uid} = chat_id
+CHAT_PAIRS_PATH = "chat_pairs"
+# Отметка о построении индекса для существующих чатов
+CHAT_PAIRS_MIGRATION_PATH = "migrations/chat_pairs"
+# Непрочитанные сообщения: chat_unread/{uid}/{chat_id} = количество
+CHAT_UNREAD_PATH = "chat_unread"
+# Общее количество непрочитанных сообщений пользователя: unread_total/{uid}
+UNREAD_TOTAL_PATH = "unread_total"
+# Отметка о начале разделения старых чатов на заголовки и сообщения (ставит один воркер)
+CHAT_SPLIT_MIGRATION_PATH = "migrations/chat_meta"
+# Отметка о том, что все старые чаты скопированы
+CHAT_SPLIT_DONE_PATH = "migrations/chat_meta_done"
+# Старый узел чатов с заголовком и сообщениями вместе: chats/{chat_id}/messages/{message_id}
+LEGACY_CHATS_PATH = "chats"
+# Пока клиенты читают чаты напрямую из LEGACY_CHATS_PATH, изменения дублируются туда же
+CHAT_LEGACY_MIRROR = os.getenv("CHAT_LEGACY_MIRROR", "1") == "1"
+# Отметка об удалении старого узла чатов после перехода клиентов
+CHAT_LEGACY_CLEANUP_PATH = "migrations/legacy_chats_removed"
+
+
+def with_legacy_mirror(updates):
+    # Добавляет к многопутевому обновлению заголовков чатов те же изменения в старом узле
+    if not CHAT_LEGACY_MIRROR:
+        return updates
+
+    mirrored = dict(updates)
+    for path, value in updates.items():
+        segments = path.strip("/").split("/")
+        if segments[0] == CHAT_META_PATH:
+            mirrored["/".join(["", LEGACY_CHATS_PATH, *segments[1:]])] = value
+    return mirrored
+
+
 async def addChatToUsers(users_ids, chat_id):
     for user_id in users_ids:
         # Получаем данные пользователя
-        user_ref = db.reference(f"/users/{user_id}")
-        user_data = user_ref.get()
+        user_data = await get_user(user_id)
 
         # Проверяем, есть ли у пользователя массив `chats`
         if "chats" not in user_data:
@@ -18,27 +72,18 @@ async def addChatToUsers(users_ids, chat_id):
             user_data["chats"].append(chat_id)
 
         # Сохраняем изменения в базе данных
-        user_ref.set(user_data)
-
-async def upload_picture_to_storage(picture, chat_id):
-    bucket = storage.bucket()
-    random_id = shortuuid.uuid()
-    new_filename = f"{random_id}.jpg"
-    file_path = f"chats/{chat_id}/pictures/{new_filename}"
-
-    blob = bucket.blob(file_path)
-    blob.upload_from_string(picture.file.read(), content_type=picture.content_type)
+        await set_user(user_id, user_data)
 
-    # Make the file public for infinite access
-    blob.make_public()
+async def upload_picture_to_storage(picture):
+    return await upload_picture(picture)
 
-    new_image_url = blob.public_url
-
-    return new_image_url
+def chat_pair_key(user_id, recipient_id):
+    # Ключ пары собеседников не зависит от того, кто из них отправитель
+    return "_".join(sorted((user_id, recipient_id)))
 
 async def create_new_chat(user_id, recipient_id, last_action):
     # Генерация нового айди чата
-    chat_id = db.reference("/chats").push().key
+    chat_id = await db_push(f"/{CHAT_META_PATH}")
 
     # Создаём дату и время
     now = datetime.datetime.now().isoformat()
@@ -57,12 +102,22 @@ async def create_new_chat(user_id, recipient_id, last_action):
                 "uid": recipient_id,
                 "last_action_viewed": True
             }
-        },
-        "messages": {}
+        }
     }
 
-    # Сохраняем чат в базе данных
-    db.reference(f"/chats/{chat_id}").set(new_chat)
+    # Сохраняем чат и индекс пары собеседников одним обновлением
+    await db_update_paths(with_legacy_mirror({
+        f"/{CHAT_META_PATH}/{chat_id}": new_chat,
+        f"/{CHAT_PAIRS_PATH}/{chat_pair_key(user_id, recipient_id)}": chat_id,
+    }))
+
+    # Сообщаем участникам о новом чате
+    await chat_gateway.publish([user_id, recipient_id], {
+        "type": "last_action",
+        "chat_id": chat_id,
+        "last_action": last_action,
+        "last_action_date": now,
+    })
 
     # Возвращаем айди нового чата
     return chat_id
@@ -80,33 +135,231 @@ async def add_message_to_chat(chat_id, sender_id, text, pictures=None):
 
     # Если есть картинки, добавляем их в данные сообщения
     if pictures:
-        new_message["pictures"] = []
-        for picture in pictures:
-            # Загружаем картинку в Firebase Storage и получаем URL
-            picture_url = await upload_picture_to_storage(picture=picture, chat_id=chat_id)
-            new_message["pictures"].append(picture_url)
-
-    # Получаем сообщения чата из базы данных
-    chat_ref = db.reference(f"/chats/{chat_id}/messages")
+        # Загружаем картинки в Firebase Storage параллельно и получаем URL вариантов
+        variants = await upload_pictures(pictures)
+        new_message["pictures"] = [picture["full"] for picture in variants]
+        new_message["pictures_variants"] = variants
 
     # Добавляем новое сообщение в чат
-    chat_ref.push(new_message)
+    try:
+        message_id = await push_chat_message(chat_id, new_message)
+    except Exception:
+        # Сообщение не сохранено - снимаем ссылки с загруженных для него картинок
+        await release_pictures(new_message.get("pictures", []))
+        raise
+
+    users_ids = list(await db_get(f"/{CHAT_META_PATH}/{chat_id}/users", shallow=True) or {})
+    recipients_ids = [user_id for user_id in users_ids if user_id != sender_id]
+
+    # Увеличиваем счётчики непрочитанных у получателей одним обновлением
+    updates = {}
+    for user_id in recipients_ids:
+        updates[f"/{CHAT_UNREAD_PATH}/{user_id}/{chat_id}"] = increment(1)
+        updates[f"/{UNREAD_TOTAL_PATH}/{user_id}"] = increment(1)
+        updates[f"/{CHAT_META_PATH}/{chat_id}/users/{user_id}/last_action_viewed"] = False
+    if CHAT_LEGACY_MIRROR:
+        updates[f"/{LEGACY_CHATS_PATH}/{chat_id}/messages/{message_id}"] = new_message
+    if updates:
+        await db_update_paths(with_legacy_mirror(updates))
+
+    # Отправляем сообщение подключённым участникам чата
+    await chat_gateway.publish(users_ids, {
+        "type": "message",
+        "chat_id": chat_id,
+        "message": compact_message(message_id, new_message),
+    })
+
+async def mark_chat_read(chat_id, uid):
+    """
+    Сбрасывает счётчик непрочитанных сообщений чата у пользователя.
+
+    Счётчик обнуляется в транзакции, поэтому из общего счётчика вычитается
+    ровно то количество, которое было сброшено, даже если одновременно
+    приходят новые сообщения.
+
+    Returns:
+        Общее количество непрочитанных сообщений пользователя.
+    """
+
+    cleared = 0
+
+    def transaction_update(count):
+        nonlocal cleared
+        cleared = count or 0
+        # Транзакция Firebase не может вернуть None, поэтому счётчик обнуляется, а не удаляется
+        return 0
+
+    await db_transaction(f"/{CHAT_UNREAD_PATH}/{uid}/{chat_id}", transaction_update)
+
+    updates = {f"/{CHAT_META_PATH}/{chat_id}/users/{uid}/last_action_viewed": True}
+    if cleared:
+        updates[f"/{UNREAD_TOTAL_PATH}/{uid}"] = increment(-cleared)
+    await db_update_paths(with_legacy_mirror(updates))
+
+    return await get_unread_total(uid)
+
+async def get_unread_total(uid):
+    return max(await db_get(f"/{UNREAD_TOTAL_PATH}/{uid}") or 0, 0)
+
+async def getChatByUserId(user_id, recipient_id):
+    # Находим чат двух пользователей по индексу пар собеседников
+    return await db_get(f"/{CHAT_PAIRS_PATH}/{chat_pair_key(user_id, recipient_id)}")
+
+async def migrate_chat_pairs():
+    # Однократно строим индекс пар собеседников для чатов, созданных до его появления.
+    # Пока старые чаты не скопированы в chat_meta целиком, индекс не строится:
+    # его построит воркер, который выполняет копирование
+    if await db_get(f"/{CHAT_PAIRS_MIGRATION_PATH}") or not await db_get(f"/{CHAT_SPLIT_DONE_PATH}"):
+        return
+
+    chats_ids = list(await db_get(f"/{CHAT_META_PATH}", shallow=True) or {})
+    chats_users = await db_get_many(f"/{CHAT_META_PATH}/{chat_id}/users" for chat_id in chats_ids)
+
+    updates = {}
+    for chat_id, users in zip(chats_ids, chats_users):
+        uids = [user["uid"] for user in (users or {}).values()]
+        if len(uids) == 2:
+            updates[f"/{CHAT_PAIRS_PATH}/{chat_pair_key(*uids)}"] = chat_id
 
-async def getChatByUserId(chats, user_id):
-    # Функция проверки наличия чатов и чата с указанным пользователем
-    if chats is None:
-        return None
+    if updates:
+        await db_update_paths(updates)
+    await db_set(f"/{CHAT_PAIRS_MIGRATION_PATH}", True)
 
-    for chat_id in chats:
-        chat_ref = db.reference(f"/chats/{chat_id}")
-        chat_data = chat_ref.get()
+def compact_message(message_id, message):
+    # Сообщение в компактном виде для истории чата
+    pictures = message.get("pictures_variants")
+    if pictures is None and message.get("pictures"):
+        # У картинок, загруженных до появления вариантов, все варианты - оригинал
+        pictures = [{name: url for name in IMAGE_VARIANTS} for url in message["pictures"]]
 
-        # Проверяем есть ли чат с recipient_id пользователем
-        for user in chat_data["users"].values():
-            if user["uid"] == user_id:
-                return chat_id
+    return {
+        "id": message_id,
+        "sender_id": message.get("sender_id"),
+        "text": message.get("text", ""),
+        "timestamp": message.get("timestamp"),
+        "pictures": pictures,
+    }
+
+async def is_chat_member(chat_id, uid):
+    return await db_get(f"/{CHAT_META_PATH}/{chat_id}/users/{uid}") is not None
+
+async def get_chat_messages(chat_id, limit, cursor=None):
+    """
+    Возвращает страницу истории чата, от новых сообщений к старым.
+
+    Args:
+        chat_id: Id чата.
+        limit: Количество сообщений на странице.
+        cursor: Id сообщения, перед которым начинается страница; None для последних сообщений.
+
+    Returns:
+        (сообщения в хронологическом порядке, курсор следующей страницы или None).
+    """
+
+    # Ключи push упорядочены по времени, поэтому страница - это limit ключей перед курсором.
+    # end_at включает сам курсор, и ещё одно сообщение нужно, чтобы узнать, есть ли следующая страница
+    fetch_limit = limit + 1 + (1 if cursor else 0)
+    messages = await db_get_last(f"/{CHAT_MESSAGES_PATH}/{chat_id}", fetch_limit, end_at=cursor) or {}
+
+    items = list(messages.items())
+    if cursor and items and items[-1][0] == cursor:
+        items.pop()
+
+    has_more = len(items) > limit
+    items = items[-limit:]
+    next_cursor = items[0][0] if has_more and items else None
+
+    return [compact_message(message_id, message) for message_id, message in items], next_cursor
+
+async def get_user_chats(uid):
+    # Заголовки чатов пользователя, от последних действий к ранним
+    chats_ids = await db_get(f"/users/{uid}/chats") or []
+    chats = await db_get_many(f"/{CHAT_META_PATH}/{chat_id}" for chat_id in dict.fromkeys(chats_ids))
+    chats = [chat for chat in chats if chat]
+
+    # Профили собеседников загружаются пакетно
+    companions_ids = {
+        chat["chat_id"]: next((user_id for user_id in chat.get("users", {}) if user_id != uid), None)
+        for chat in chats
+    }
+    companions = await get_profiles(user_id for user_id in companions_ids.values() if user_id)
+
+    unread = await db_get(f"/{CHAT_UNREAD_PATH}/{uid}") or {}
+
+    for chat in chats:
+        chat["companion"] = companions.get(companions_ids[chat["chat_id"]])
+        chat["unread"] = unread.get(chat["chat_id"], 0)
+
+    chats.sort(key=lambda chat: chat.get("last_action_date", ""), reverse=True)
+    return chats
+
+async def migrate_chat_messages():
+    """
+    Однократно копирует старые чаты /chats/{chat_id} в заголовки и сообщения.
 
-    return None
+    Заголовок записывается в chat_meta, сообщения в chat_messages. Старый узел
+    не удаляется: клиенты читают чаты из него напрямую, а пока включено
+    CHAT_LEGACY_MIRROR, новые изменения дублируются туда же. Поля заголовка и
+    сообщения записываются по отдельным путям, поэтому изменения, сделанные
+    во время копирования, не затираются снимком. Копирование выполняет только
+    воркер, первым поставивший отметку; по окончании ставится отметка
+    CHAT_SPLIT_DONE_PATH, от которой зависят следующие шаги миграции.
+    """
+
+    if not await db_claim(f"/{CHAT_SPLIT_MIGRATION_PATH}"):
+        return
+
+    try:
+        for chat_id in list(await db_get(f"/{LEGACY_CHATS_PATH}", shallow=True) or {}):
+            chat_data = await db_get(f"/{LEGACY_CHATS_PATH}/{chat_id}")
+            if not isinstance(chat_data, dict):
+                continue
+
+            messages = chat_data.pop("messages", None) or {}
+            if isinstance(messages, list):
+                messages = {str(i): message for i, message in enumerate(messages) if message}
+
+            updates = {}
+            for field, value in chat_data.items():
+                if field == "users" and isinstance(value, dict):
+                    for user_id, user in value.items():
+                        updates[f"/{CHAT_META_PATH}/{chat_id}/users/{user_id}"] = user
+                else:
+                    updates[f"/{CHAT_META_PATH}/{chat_id}/{field}"] = value
+            for message_id, message in messages.items():
+                updates[f"/{CHAT_MESSAGES_PATH}/{chat_id}/{message_id}"] = message
+            if updates:
+                await db_update_paths(updates)
+
+        await db_set(f"/{CHAT_SPLIT_DONE_PATH}", True)
+    except Exception:
+        # Снимаем отметку, чтобы копирование повторилось при следующем запуске
+        await db_set(f"/{CHAT_SPLIT_MIGRATION_PATH}", False)
+        raise
+
+async def remove_legacy_chats():
+    """
+    Удаляет старые узлы /chats/{chat_id} после перехода клиентов на chat_meta.
+
+    Выполняется только при отключённом дублировании (CHAT_LEGACY_MIRROR=0),
+    после завершения копирования старых чатов и один раз: отметку ставит
+    первый воркер. Удаляются только чаты, которые уже скопированы в chat_meta.
+    """
+
+    if CHAT_LEGACY_MIRROR or not await db_get(f"/{CHAT_SPLIT_DONE_PATH}"):
+        return
+    if not await db_claim(f"/{CHAT_LEGACY_CLEANUP_PATH}"):
+        return
+
+    legacy_ids = await db_get(f"/{LEGACY_CHATS_PATH}", shallow=True) or {}
+    migrated_ids = await db_get(f"/{CHAT_META_PATH}", shallow=True) or {}
+    updates = {
+        f"/{LEGACY_CHATS_PATH}/{chat_id}": None
+        for chat_id in legacy_ids
+        if chat_id in migrated_ids
+    }
+    if updates:
+        await db_update_paths(updates)
 
 async def change_chat_last_action(chat_id, pictures, text):
     # Формируем последнее действие
@@ -120,14 +373,14 @@ async def change_chat_last_action(chat_id, pictures, text):
     # Создаём дату и время
     now = datetime.datetime.now().isoformat()
 
-    # Находим чат
-    chat_ref = db.reference(f"/chats/{chat_id}")
-    chat_data = chat_ref.get()
-
-    # Меняем значения
-
-    chat_data["last_action"] = last_action
-    chat_data["last_action_date"] = now
+    # Меняем только поля заголовка чата, сообщения не перезаписываются
+    values = {
+        "last_action": last_action,
+        "last_action_date": now,
+    }
+    await db_update_paths(with_legacy_mirror({
+        f"/{CHAT_META_PATH}/{chat_id}/{field}": value for field, value in values.items()
+    }))
 
-    # Сохраняем
-    chat_ref.set(chat_data)
\ No newline at end of file
+    # Сообщаем подключённым участникам чата о новом последнем действии
+    await chat_gateway.publish_to_chat(chat_id, {"type": "last_action", **values})
@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import os
+import time
+import firebase_conf
+
+from concurrent.futures import ThreadPoolExecutor
+from firebase_admin import db
+from requests.adapters import DEFAULT_POOLSIZE
+
+# Количество потоков для запросов к Firebase Realtime Database
+FIREBASE_IO_WORKERS = int(os.getenv("FIREBASE_IO_WORKERS", 32))
+
+_executor = ThreadPoolExecutor(
+    max_workers=FIREBASE_IO_WORKERS, thread_name_prefix="firebase-io"
+)
+
+
+def _configure_connection_pool():
+    # Клиент Realtime Database один на приложение и переиспользует HTTP-соединения,
+    # но по умолчанию держит только 10 соединений на хост. Расширяем пул до числа
+    # потоков, чтобы параллельные запросы не открывали новые соединения.
+    try:
+        session = db.reference("/")._client.session
+        for adapter in session.adapters.values():
+            adapter.init_poolmanager(DEFAULT_POOLSIZE, FIREBASE_IO_WORKERS)
+    except AttributeError:
+        pass
+
+
+_configure_connection_pool()
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Выполняет блокирующий вызов Firebase в пуле потоков, не блокируя цикл событий.
+
+    Args:
+        func: Блокирующая функция, например метод db.Reference.
+        *args, **kwargs: Аргументы функции.
+
+    Returns:
+        Результат функции.
+    """
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def db_get(path: str, shallow: bool = False):
+    return await run_db(db.reference(path).get, shallow=shallow)
+
+
+async def db_set(path: str, value):
+    await run_db(db.reference(path).set, value)
+
+
+async def db_update(path: str, value: dict):
+    await run_db(db.reference(path).update, value)
+
+
+def increment(delta: int):
+    # Серверное атомарное увеличение числа; можно использовать в db_update и db_update_paths
+    return {".sv": {"increment": delta}}
+
+
+async def db_update_paths(updates: dict):
+    # Атомарно записывает несколько узлов за один запрос: ключи - пути от корня базы
+    await db_update("/", updates)
+
+
+async def db_push(path: str, value=""):
+    # Возвращает ключ новой записи
+    ref = await run_db(db.reference(path).push, value)
+    return ref.key
+
+
+async def db_delete(path: str):
+    await run_db(db.reference(path).delete)
+
+
+async def db_get_last(path: str, limit: int, end_at: str = None):
+    # Последние limit дочерних узлов по ключу, не позже end_at включительно
+    query = db.reference(path).order_by_key()
+    if end_at is not None:
+        query = query.end_at(end_at)
+    return await run_db(query.limit_to_last(limit).get)
+
+
+async def db_transaction(path: str, transaction_update):
+    return await run_db(db.reference(path).transaction, transaction_update)
+
+
+class _AlreadyClaimed(Exception):
+    pass
+
+
+async def db_claim(path: str):
+    """
+    Атомарно ставит отметку по пути, если её ещё нет.
+
+    Так однократную работу, например миграцию при запуске, выполняет только
+    один воркер, даже если несколько воркеров стартуют одновременно.
+
+    Returns:
+        True, если отметку поставил этот вызов.
+    """
+
+    def transaction_update(value):
+        if value:
+            raise _AlreadyClaimed()
+        return True
+
+    try:
+        await db_transaction(path, transaction_update)
+    except _AlreadyClaimed:
+        return False
+    return True
+
+
+async def db_claim_lease(path: str, seconds: float):
+    """
+    Атомарно берёт аренду по пути, если её нет или она старше seconds секунд.
+
+    В отличие от db_claim отметка со временем истекает, поэтому так делится
+    работа, которую один из воркеров должен выполнять после каждого запуска.
+
+    Returns:
+        True, если аренду взял этот вызов.
+    """
+
+    now = time.time()
+
+    def transaction_update(value):
+        if value and now - value < seconds:
+            raise _AlreadyClaimed()
+        return now
+
+    try:
+        await db_transaction(path, transaction_update)
+    except _AlreadyClaimed:
+        return False
+    return True
+
+
+async def db_get_many(paths):
+    # Параллельно читает несколько узлов и возвращает значения в порядке путей
+    return await asyncio.gather(*[db_get(path) for path in paths])
+
+
+# Пользователи
+
+async def get_user(uid: str):
+    return await db_get(f"/users/{uid}")
+
+
+async def set_user(uid: str, user_data: dict):
+    await db_set(f"/users/{uid}", user_data)
+
+
+async def update_user(uid: str, values: dict):
+    await db_update(f"/users/{uid}", values)
+
+
+# Услуги
+
+async def get_service(service_id: str):
+    return await db_get(f"/services/{service_id}")
+
+
+async def set_service(service_id: str, service_data: dict):
+    await db_set(f"/services/{service_id}", service_data)
+
+
+async def update_service(service_id: str, values: dict):
+    await db_update(f"/services/{service_id}", values)
+
+
+async def delete_service(service_id: str):
+    await db_delete(f"/services/{service_id}")
+
+
+# Бронирования
+
+async def get_booking(booking_id: str):
+    return await db_get(f"/booked_services/{booking_id}")
+
+
+async def set_booking(booking_id: str, booking_data: dict):
+    await db_set(f"/booked_services/{booking_id}", booking_data)
+
+
+async def update_booking(booking_id: str, values: dict):
+    await db_update(f"/booked_services/{booking_id}", values)
+
+
+# Чаты
+
+# Заголовки чатов (участники и последнее действие) хранятся отдельно от сообщений
+CHAT_META_PATH = "chat_meta"
+CHAT_MESSAGES_PATH = "chat_messages"
+
+
+async def get_chat(chat_id: str):
+    return await db_get(f"/{CHAT_META_PATH}/{chat_id}")
+
+
+async def set_chat(chat_id: str, chat_data: dict):
+    await db_set(f"/{CHAT_META_PATH}/{chat_id}", chat_data)
+
+
+async def update_chat(chat_id: str, values: dict):
+    await db_update(f"/{CHAT_META_PATH}/{chat_id}", values)
+
+
+async def push_chat_message(chat_id: str, message: dict):
+    return await db_push(f"/{CHAT_MESSAGES_PATH}/{chat_id}", message)
+
+
+# Уведомления
+
+async def get_notifications(uid: str):
+    return await db_get(f"/users/{uid}/notifications")
+
+
+async def set_notifications(uid: str, notifications: list):
+    await db_set(f"/users/{uid}/notifications", notifications)
@@ -0,0 +1,101 @@
+import csv
+import os
+import numpy as np
+
+from utils.geo_index import GeoGridIndex, haversine_km
+
+# Файл справочника населённых пунктов и районов; собирается скриптом build_gazetteer.py
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "gazetteer.csv")
+# Радиус, в котором центр места считается подходящим, если в справочнике не указан свой
+GAZETTEER_DEFAULT_RADIUS_KM = 15.0
+# Размер ячейки геоиндекса справочника в градусах
+GAZETTEER_CELL_SIZE = 0.25
+
+
+class Gazetteer:
+    """
+    Офлайн-справочник для обратного геокодирования по центрам мест.
+
+    Справочник - CSV-файл с колонками name, lat, lon и необязательными колонками
+    radius_km (радиус покрытия места в километрах) и name_<язык> (название на
+    нужном языке, например name_ru, name_en, name_uz). Для точки выбирается
+    ближайшее место, в радиус покрытия которого она попадает.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.geo = GeoGridIndex(cell_size=GAZETTEER_CELL_SIZE)
+        self.lat = np.empty(0)
+        self.lon = np.empty(0)
+        self.radius = np.empty(0)
+        self.max_radius = 0.0
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self, path):
+        names, lats, lons, radiuses = [], [], [], []
+
+        with open(path, newline="", encoding="utf-8") as file:
+            for record in csv.DictReader(file):
+                try:
+                    lat = float(record["lat"])
+                    lon = float(record["lon"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+                try:
+                    radius = float(record.get("radius_km") or GAZETTEER_DEFAULT_RADIUS_KM)
+                except ValueError:
+                    radius = GAZETTEER_DEFAULT_RADIUS_KM
+
+                # Названия на разных языках: {"": name, "ru": name_ru, ...}
+                place_names = {"": record.get("name") or ""}
+                for column, value in record.items():
+                    if column and column.startswith("name_") and value:
+                        place_names[column[len("name_"):]] = value
+
+                names.append(place_names)
+                lats.append(lat)
+                lons.append(lon)
+                radiuses.append(radius)
+
+        self.names = names
+        self.lat = np.array(lats, dtype=np.float64)
+        self.lon = np.array(lons, dtype=np.float64)
+        self.radius = np.array(radiuses, dtype=np.float64)
+        self.max_radius = float(self.radius.max()) if len(radiuses) else 0.0
+
+        self.geo.clear()
+        for row, (lat, lon) in enumerate(zip(lats, lons)):
+            self.geo.insert(row, lat, lon)
+
+    def lookup(self, lat, lon, language="ru"):
+        # Возвращает название ближайшего места или None, если точка не покрыта справочником
+        if not self.names:
+            return None
+
+        rows = np.fromiter(self.geo.query_radius(lat, lon, self.max_radius), dtype=np.int64)
+        if not len(rows):
+            return None
+
+        distances = haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+        covered = distances <= self.radius[rows]
+        if not covered.any():
+            return None
+
+        row = rows[covered][np.argmin(distances[covered])]
+        place_names = self.names[row]
+        return place_names.get(language) or place_names[""] or None
+
+
+gazetteer = Gazetteer()
+
+if os.path.exists(GAZETTEER_PATH):
+    try:
+        gazetteer.load(GAZETTEER_PATH)
+    except (OSError, csv.Error) as e:
+        print(f"Не удалось загрузить справочник мест {GAZETTEER_PATH}: {e}")
+else:
+    # Справочник не входит в репозиторий и собирается скриптом build_gazetteer.py
+    print(f"Справочник мест {GAZETTEER_PATH} не найден, адреса будут запрашиваться у геокодера")
@@ -0,0 +1,151 @@
+import math
+import numpy as np
+
+from geopy.distance import geodesic
+
+# Примерная длина одного градуса широты в километрах
+KM_PER_DEGREE = 111.32
+# Средний радиус Земли в километрах
+EARTH_RADIUS_KM = 6371.0088
+# Относительная погрешность гаверсинуса по сравнению с геодезическим расстоянием
+HAVERSINE_TOLERANCE = 0.005
+
+
+class GeoGridIndex:
+    """
+    Сеточный пространственный индекс по широте и долготе.
+
+    Точки раскладываются по ячейкам размером cell_size градусов, поэтому запрос
+    по радиусу просматривает только ячейки, которые пересекает окружность поиска.
+    Столбцы ячеек замыкаются по долготе, так что окружность у ±180° захватывает
+    ячейки по обе стороны антимеридиана.
+    """
+
+    def __init__(self, cell_size: float = 0.05):
+        self.cell_size = cell_size
+        # Количество столбцов ячеек на всю окружность долготы
+        self.columns_count = int(math.ceil(360.0 / cell_size))
+        self.cells = {}
+        self.points = {}
+
+    def _row(self, lat):
+        return int(math.floor(lat / self.cell_size))
+
+    def _column(self, lon):
+        # Долгота отсчитывается от -180°, номер столбца замыкается по кругу
+        return int(math.floor((lon + 180.0) / self.cell_size)) % self.columns_count
+
+    def _cell(self, lat, lon):
+        return self._row(lat), self._column(lon)
+
+    def __len__(self):
+        return len(self.points)
+
+    def clear(self):
+        self.cells = {}
+        self.points = {}
+
+    def insert(self, key, lat, lon):
+        # Если точка уже была в индексе, убираем её старое положение
+        self.remove(key)
+
+        cell = self._cell(lat, lon)
+        self.cells.setdefault(cell, set()).add(key)
+        self.points[key] = (lat, lon, cell)
+
+    def remove(self, key):
+        point = self.points.pop(key, None)
+        if point is None:
+            return
+
+        cell = point[2]
+        bucket = self.cells.get(cell)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self.cells[cell]
+
+    def query_radius(self, lat, lon, radius_km):
+        """
+        Возвращает ключи точек из ячеек, пересекающих окружность поиска.
+
+        Результат является кандидатами: точное расстояние до каждой точки
+        нужно проверить отдельно.
+        """
+
+        lat_delta = radius_km / KM_PER_DEGREE
+        # Ближе к полюсам градус долготы становится короче
+        cos_lat = math.cos(math.radians(min(abs(lat) + lat_delta, 89.9)))
+        lon_delta = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+
+        min_row, max_row = self._row(lat - lat_delta), self._row(lat + lat_delta)
+        first_col = int(math.floor((lon - lon_delta + 180.0) / self.cell_size))
+        last_col = int(math.floor((lon + lon_delta + 180.0) / self.cell_size))
+        # Окружность, накрывающая полюс, пересекает все меридианы
+        reaches_pole = abs(lat) + lat_delta >= 90.0
+        if reaches_pole or last_col - first_col + 1 >= self.columns_count:
+            columns = range(self.columns_count)
+        else:
+            columns = [col % self.columns_count for col in range(first_col, last_col + 1)]
+
+        # Если окружность покрывает больше ячеек, чем заполнено, проще пройти по заполненным
+        cells_count = (max_row - min_row + 1) * len(columns)
+        if cells_count > len(self.cells):
+            columns = set(columns)
+            keys = []
+            for (row, col), bucket in self.cells.items():
+                if min_row <= row <= max_row and col in columns:
+                    keys.extend(bucket)
+            return keys
+
+        keys = []
+        for row in range(min_row, max_row + 1):
+            for col in columns:
+                bucket = self.cells.get((row, col))
+                if bucket:
+                    keys.extend(bucket)
+        return keys
+
+
+def haversine_km(lat, lon, lats, lons):
+    """
+    Рассчитывает расстояния от одной точки до массива точек за один проход NumPy.
+
+    Args:
+        lat (float): Широта исходной точки.
+        lon (float): Долгота исходной точки.
+        lats (np.ndarray): Широты точек.
+        lons (np.ndarray): Долготы точек.
+
+    Returns:
+        np.ndarray: Расстояния в километрах по большой окружности.
+    """
+
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons) - math.radians(lon)
+
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def within_radius(lat, lon, lats, lons, radius_km, exact=True):
+    """
+    Возвращает маску точек, попадающих в радиус, и расстояния до них.
+
+    Гаверсинус считается для всех точек сразу, а точное геодезическое расстояние
+    пересчитывается только для точек у границы радиуса, где гаверсинус может ошибиться.
+    """
+
+    distances = haversine_km(lat, lon, lats, lons)
+    mask = distances <= radius_km
+
+    if exact and len(distances):
+        band = radius_km * HAVERSINE_TOLERANCE
+        border = np.flatnonzero(np.abs(distances - radius_km) <= band)
+        for i in border:
+            distances[i] = geodesic((lat, lon), (lats[i], lons[i])).kilometers
+            mask[i] = distances[i] <= radius_km
+
+    return mask, distances
@@ -0,0 +1,104 @@
+import math
+import os
+
+from tempfile import SpooledTemporaryFile
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Варианты изображения и максимальный размер большей стороны в пикселях
+IMAGE_VARIANTS = {
+    "thumbnail": 256,
+    "card": 800,
+    "full": 1920,
+}
+# Формат сохранения вариантов: WEBP или JPEG
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "WEBP").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 82))
+# Варианты больше этого размера в байтах сбрасываются из памяти во временный файл
+IMAGE_SPOOL_SIZE = int(os.getenv("IMAGE_SPOOL_SIZE", 1024 * 1024))
+# Байт на пиксель декодированного изображения (RGBA)
+DECODED_PIXEL_SIZE = 4
+
+IMAGE_CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+IMAGE_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+IMAGE_CONTENT_TYPE = IMAGE_CONTENT_TYPES[IMAGE_FORMAT]
+IMAGE_EXTENSION = IMAGE_EXTENSIONS[IMAGE_FORMAT]
+
+
+def _open_image(file):
+    # Открывает изображение без декодирования пикселей
+    file.seek(0)
+    try:
+        image = Image.open(file)
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=422, detail="Файл не является изображением.")
+
+    # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8), достаточном
+    # для самого большого варианта, поэтому полный кадр с камеры не попадает в память
+    width, height = image.size
+    scale = max(IMAGE_VARIANTS.values()) / max(width, height)
+    if scale < 1:
+        image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+    return image
+
+
+def decoded_size(file):
+    """
+    Оценивает, сколько памяти займёт декодированное изображение.
+
+    Args:
+        file: Файловый объект с изображением.
+
+    Returns:
+        Размер в байтах.
+    """
+
+    width, height = _open_image(file).size
+    return width * height * DECODED_PIXEL_SIZE
+
+
+def _load_image(file):
+    image = _open_image(file)
+    try:
+        image.load()
+    except OSError:
+        raise HTTPException(status_code=422, detail="Файл не является изображением.")
+
+    # Фотографии с телефона часто повёрнуты только через EXIF
+    image = ImageOps.exif_transpose(image)
+
+    has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+    if has_alpha and IMAGE_FORMAT == "WEBP":
+        return image.convert("RGBA")
+    return image.convert("RGB")
+
+
+def make_variants(file):
+    """
+    Строит уменьшенные варианты изображения.
+
+    Изображение только уменьшается с сохранением пропорций, поэтому маленькие
+    картинки остаются в исходном размере. Каждый вариант записывается во
+    временный файл, который хранится в памяти, пока не превысит IMAGE_SPOOL_SIZE.
+
+    Args:
+        file: Файловый объект с изображением.
+
+    Returns:
+        Словарь {название варианта: временный файл в IMAGE_FORMAT, указатель в начале}.
+    """
+
+    image = _load_image(file)
+    variants = {}
+
+    # От большего варианта к меньшему, чтобы каждый следующий уменьшать с предыдущего
+    for name, size in sorted(IMAGE_VARIANTS.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+
+        variant = SpooledTemporaryFile(max_size=IMAGE_SPOOL_SIZE)
+        image.save(variant, IMAGE_FORMAT, quality=IMAGE_QUALITY)
+        variant.seek(0)
+        variants[name] = variant
+
+    return variants
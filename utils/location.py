@@ -1,8 +1,168 @@
+import asyncio
+import os
+import sqlite3
+import threading
+
+from collections import OrderedDict
 from geopy.geocoders import Nominatim
 
-async def get_location_name(lat, lon):
+from utils.gazetteer import gazetteer
+
+# Количество знаков после запятой, до которых округляются координаты (~110 м)
+GEOCODE_PRECISION = 3
+# Максимальное количество адресов в памяти процесса
+GEOCODE_CACHE_SIZE = 5000
+# Файл с кэшем адресов на диске
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "geocode_cache.sqlite3")
+# Если указан адрес Redis, кэш адресов хранится в нём и общий для всех воркеров
+REDIS_URL = os.getenv("REDIS_URL")
+# Время жизни адреса в Redis, в секундах
+GEOCODE_REDIS_TTL = 30 * 24 * 60 * 60
+# Запрашивать ли Nominatim для мест, которых нет в офлайн-справочнике
+GEOCODER_FALLBACK = os.getenv("GEOCODER_FALLBACK", "1") == "1"
+
+UNKNOWN_LOCATION = "Неизвестное местоположение"
+
+geolocator = Nominatim(user_agent="intop_api")
+
+
+def cache_key(lat, lon, language):
+    # Координаты округляются, чтобы соседние точки попадали в одну запись кэша
+    return f"{round(float(lat), GEOCODE_PRECISION)}:{round(float(lon), GEOCODE_PRECISION)}:{language}"
+
+
+class SqliteGeocodeStore:
+    # Хранилище адресов в локальном файле SQLite
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS geocode (key TEXT PRIMARY KEY, name TEXT NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT name FROM geocode WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key, name):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO geocode (key, name) VALUES (?, ?)", (key, name)
+            )
+            self._connection.commit()
+
+    async def get(self, key):
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key, name):
+        await asyncio.to_thread(self._set, key, name)
+
+
+class RedisGeocodeStore:
+    # Хранилище адресов в Redis
+
+    def __init__(self, url):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key):
+        return await self._redis.get(f"geocode:{key}")
+
+    async def set(self, key, name):
+        await self._redis.set(f"geocode:{key}", name, ex=GEOCODE_REDIS_TTL)
+
+
+class ReverseGeocodeCache:
+    """
+    Двухуровневый кэш обратного геокодирования.
+
+    Первый уровень - LRU в памяти процесса, второй - файл SQLite или Redis.
+    Ненайденные адреса хранятся как пустая строка, чтобы не запрашивать их повторно.
+    """
+
+    def __init__(self, store, max_size=GEOCODE_CACHE_SIZE):
+        self.store = store
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def _remember(self, key, name):
+        self._entries[key] = name
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        try:
+            name = await self.store.get(key)
+        except Exception as e:
+            print(f"Ошибка чтения кэша адресов: {e}")
+            return None
+
+        if name is not None:
+            self._remember(key, name)
+        return name
+
+    async def set(self, key, name):
+        self._remember(key, name)
+        try:
+            await self.store.set(key, name)
+        except Exception as e:
+            print(f"Ошибка записи кэша адресов: {e}")
+
+
+geocode_cache = ReverseGeocodeCache(
+    RedisGeocodeStore(REDIS_URL) if REDIS_URL else SqliteGeocodeStore(GEOCODE_CACHE_PATH)
+)
+
+
+async def reverse_geocode(lat, lon, language="ru", raise_errors=False):
+    """
+    Возвращает адрес по координатам или None, если адрес не найден.
+
+    Сначала ищет место в офлайн-справочнике, затем в кэше и только после этого,
+    если разрешено GEOCODER_FALLBACK, запрашивает Nominatim. Ошибки Nominatim
+    пробрасываются только при raise_errors=True, чтобы вызывающий код мог повторить запрос.
+    """
+
+    name = gazetteer.lookup(float(lat), float(lon), language)
+    if name:
+        return name
+
+    key = cache_key(lat, lon, language)
+
+    name = await geocode_cache.get(key)
+    if name is None:
+        if not GEOCODER_FALLBACK:
+            return None
+
+        try:
+            location = await asyncio.to_thread(
+                geolocator.reverse, (lat, lon), language=language
+            )
+        except Exception as e:
+            # Сеть недоступна или превышен лимит запросов: не кэшируем ошибку
+            if raise_errors:
+                raise
+            print(f"Ошибка обратного геокодирования: {e}")
+            return None
+
+        name = location.address if location else ""
+        await geocode_cache.set(key, name)
+
+    return name or None
+
+
+async def get_location_name(lat, lon, language="ru"):
     # Получение названия локации по координатам
-    geolocator = Nominatim(user_agent="your_app_name")
-    location = geolocator.reverse((lat, lon), language="ru")
-    location_name = location.address if location else "Неизвестное местоположение"
-    return location_name
\ No newline at end of file
+    location_name = await reverse_geocode(lat, lon, language)
+    return location_name or UNKNOWN_LOCATION
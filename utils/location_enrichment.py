@@ -0,0 +1,136 @@
+import asyncio
+
+from utils.firebase_db import db_claim_lease, db_transaction
+from utils.location import UNKNOWN_LOCATION, cache_key, reverse_geocode
+from utils.services_catalog import get_services_catalog, services_catalog
+
+# Значение location_name, пока адрес услуги ещё определяется
+LOCATION_PENDING = ""
+# Количество фоновых задач, которые обращаются к геокодеру
+LOCATION_WORKERS = 2
+# Сколько раз повторять запрос к геокодеру при ошибке
+LOCATION_RETRIES = 3
+# Пауза перед первым повтором в секундах, далее удваивается
+LOCATION_RETRY_DELAY = 2
+# Аренда поиска услуг без адреса после запуска: его выполняет один воркер
+LOCATION_SCAN_LEASE_PATH = "leases/location_scan"
+LOCATION_SCAN_LEASE_SECONDS = 600
+# Сколько секунд ждать, пока реплика засеет каталог, прежде чем загрузить его самим
+LOCATION_SCAN_SYNC_WAIT = 30
+
+
+class _LocationOutdated(Exception):
+    # Прерывает транзакцию: услуга удалена или перенесена, адрес записывать не нужно
+    pass
+
+
+class LocationEnrichment:
+    """
+    Фоновое заполнение location_name у услуг.
+
+    Услуга сохраняется сразу с LOCATION_PENDING, а адрес определяется позже.
+    Услуги с одинаковыми (округлёнными) координатами, которые ждут в очереди,
+    объединяются в одну задачу и получают адрес по одному запросу к геокодеру.
+    Адрес записывается только если координаты услуги с тех пор не изменились.
+    """
+
+    def __init__(self, workers=LOCATION_WORKERS):
+        self.workers = workers
+        self._queue = None
+        self._pending = {}
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._enqueue_pending()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _enqueue_pending(self):
+        # Услуги, которые остались без адреса после перезапуска сервера. Их ищет
+        # один воркер, взявший аренду, и только после того, как реплика засеяла
+        # каталог: при запуске он ещё пуст
+        try:
+            if not await db_claim_lease(f"/{LOCATION_SCAN_LEASE_PATH}", LOCATION_SCAN_LEASE_SECONDS):
+                return
+
+            replica = services_catalog.replica
+            for _ in range(LOCATION_SCAN_SYNC_WAIT):
+                if replica is None or replica.is_live():
+                    break
+                await asyncio.sleep(1)
+
+            # Без живой реплики каталог загружается тем же запросом, что и для поиска
+            catalog = await get_services_catalog()
+        except Exception as e:
+            print(f"Не удалось загрузить услуги без адреса: {e}")
+            return
+
+        for service_id, service in list(catalog.services.items()):
+            if service and service.get("location_name", LOCATION_PENDING) == LOCATION_PENDING:
+                self.enqueue(service_id, service.get("lat"), service.get("lon"))
+
+    def enqueue(self, service_id, lat, lon):
+        # Ставит услугу в очередь на определение адреса
+        if self._queue is None or lat is None or lon is None:
+            return
+
+        key = cache_key(lat, lon, "ru")
+        job = self._pending.get(key)
+        if job is None:
+            job = self._pending[key] = {"lat": lat, "lon": lon, "services": set()}
+            self._queue.put_nowait(key)
+        job["services"].add(service_id)
+
+    async def _work(self):
+        while True:
+            key = await self._queue.get()
+            job = self._pending.pop(key)
+            try:
+                location_name = await self._resolve(job["lat"], job["lon"])
+                await asyncio.gather(*[
+                    self._save(service_id, key, location_name)
+                    for service_id in job["services"]
+                ])
+            except Exception as e:
+                print(f"Ошибка определения адреса услуг {sorted(job['services'])}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _resolve(self, lat, lon):
+        delay = LOCATION_RETRY_DELAY
+        for attempt in range(LOCATION_RETRIES + 1):
+            try:
+                location_name = await reverse_geocode(lat, lon, raise_errors=True)
+                return location_name or UNKNOWN_LOCATION
+            except Exception as e:
+                if attempt == LOCATION_RETRIES:
+                    print(f"Геокодер недоступен для {lat}, {lon}: {e}")
+                    return UNKNOWN_LOCATION
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    async def _save(self, service_id, key, location_name):
+        def transaction_update(service):
+            # Услуга удалена или перенесена в другое место - адрес уже не подходит
+            if not service or service.get("lat") is None or service.get("lon") is None:
+                raise _LocationOutdated()
+            if cache_key(service["lat"], service["lon"], "ru") != key:
+                raise _LocationOutdated()
+            service["location_name"] = location_name
+            return service
+
+        try:
+            service = await db_transaction(f"/services/{service_id}", transaction_update)
+        except _LocationOutdated:
+            return
+
+        services_catalog.upsert(service, service_id)
+
+
+location_enrichment = LocationEnrichment()
@@ -1,9 +1,17 @@
 import firebase_conf
 
+from fastapi import Response
 from firebase_admin import db, storage
 
 # Пример функции для удаления картинки из Firebase Storage
 async def delete_picture_from_storage(picture_url: str):
     bucket = storage.bucket()
     blob = bucket.blob(picture_url.split('/')[-1])
-    blob.delete()
\ No newline at end of file
+    blob.delete()
+
+def set_pagination_headers(response: Response, total: int = None, next_cursor: str = None):
+    """Добавляет в ответ общее количество найденных записей и курсор следующей страницы."""
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
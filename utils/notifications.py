@@ -4,6 +4,9 @@ import firebase_conf
 from firebase_admin import auth, db, storage
 from datetime import datetime, timedelta
 
+from utils.firebase_db import db_transaction
+from utils.profiles import get_profiles
+
 
 async def check_date(date_str):
     # Convert the date string to a datetime object
@@ -23,23 +26,33 @@ async def check_date(date_str):
     else:
         return "earlier"
 
-async def add_new_notification(user_data, uid, message):
-    # Добавляем уведомление
-    if "notifications" not in user_data:
-        user_data["notifications"] = []
-
+def new_notification(uid, message):
     # Осздаём  уведомление
-    new_notification = {
+    return {
         "id": shortuuid.uuid(),
         "user_id": uid,
         "message": message,
         "created_at": datetime.now().isoformat()
     }
 
-    user_data["notifications"].append(new_notification)
+async def add_new_notification(user_data, uid, message):
+    # Добавляем уведомление
+    if "notifications" not in user_data:
+        user_data["notifications"] = []
+
+    user_data["notifications"].append(new_notification(uid, message))
 
     return user_data
 
+async def push_notification(recipient_id, uid, message):
+    # Добавляет уведомление в транзакции, не перезаписывая документ получателя
+    notification = new_notification(uid, message)
+
+    def transaction_update(notifications):
+        return (notifications or []) + [notification]
+
+    await db_transaction(f"/users/{recipient_id}/notifications", transaction_update)
+
 async def set_notifications_array(notifications):
     # Создаём объект с сегоднешними, вчерашними и остальными уведомлениями
     array = {
@@ -48,18 +61,20 @@ async def set_notifications_array(notifications):
         "earlier": []
     }
 
+    # Получаем профили пользователей, от которых пришли уведомления, пакетно
+    senders = await get_profiles(notification['user_id'] for notification in notifications)
+
     # Проходимся по массиву уведомлений и расставляем по нужным блокам
     for notification in notifications:
 
         # Получаем данные пользователя от которого пришло уведомление
-        rec_user_ref = db.reference(f"/users/{notification['user_id']}")
-        rec_user_data = rec_user_ref.get()
+        rec_user_data = senders.get(notification['user_id'])
 
         if not rec_user_data:
             continue
 
-        avatar = rec_user_data["avatar"]
-        username = rec_user_data["username"]
+        avatar = rec_user_data.get("avatar")
+        username = rec_user_data.get("username")
         
         # Составляем объект данных
         notification_dict = {
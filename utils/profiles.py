@@ -0,0 +1,178 @@
+import asyncio
+import time
+
+from collections import OrderedDict
+
+from utils.firebase_db import db_get_many, db_set, db_update_paths
+
+# Узел с публичными профилями; каждый профиль - небольшая проекция документа /users/{uid}
+PUBLIC_PROFILES_PATH = "public_profiles"
+# Поля пользователя, которые нужны для отображения владельцев, бронирующих и авторов отзывов
+PROFILE_FIELDS = ("uid", "username", "avatar", "avatar_variants", "rating", "last_active")
+# Сколько секунд профиль хранится в кэше
+PROFILE_CACHE_TTL = 300
+# Максимальное количество профилей в кэше
+PROFILE_CACHE_SIZE = 10000
+
+
+def project_profile(user_data):
+    # Оставляет от документа пользователя только публичные поля профиля
+    if not user_data:
+        return None
+    return {field: user_data.get(field) for field in PROFILE_FIELDS}
+
+
+def is_projection(profile):
+    # Узел без имени пользователя - не полная проекция (например, только last_active)
+    return bool(profile) and profile.get("username") is not None
+
+
+class ProfileCache:
+    """
+    LRU-кэш публичных профилей пользователей с ограниченным временем жизни.
+
+    Профили читаются из небольшого узла public_profiles, а не из полного документа
+    пользователя. Если проекции ещё нет, она строится по /users/{uid} и сохраняется.
+    Отсутствующие пользователи тоже кэшируются, чтобы не запрашивать их повторно.
+    Одновременные запросы одного и того же профиля ждут одну загрузку.
+    """
+
+    def __init__(self, ttl=PROFILE_CACHE_TTL, max_size=PROFILE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._loading = {}
+
+    def get(self, uid):
+        # Возвращает (найден ли профиль в кэше, профиль)
+        entry = self._entries.get(uid)
+        if entry is None:
+            return False, None
+
+        expires_at, profile = entry
+        if expires_at < time.monotonic():
+            del self._entries[uid]
+            return False, None
+
+        self._entries.move_to_end(uid)
+        return True, profile
+
+    def put(self, uid, profile):
+        self._entries[uid] = (time.monotonic() + self.ttl, profile)
+        self._entries.move_to_end(uid)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, uid):
+        self._entries.pop(uid, None)
+
+    async def load_many(self, uids):
+        """
+        Возвращает словарь uid -> профиль (None для несуществующих пользователей).
+
+        Недостающие в кэше профили загружаются из Firebase одним параллельным пакетом.
+        """
+
+        profiles = {}
+        missing = []
+        waiting = {}
+
+        for uid in dict.fromkeys(uids):
+            if not uid:
+                continue
+            found, profile = self.get(uid)
+            if found:
+                profiles[uid] = profile
+            elif uid in self._loading:
+                waiting[uid] = self._loading[uid]
+            else:
+                missing.append(uid)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {uid: loop.create_future() for uid in missing}
+            self._loading.update(futures)
+            try:
+                loaded = await self._fetch(missing)
+                for uid, profile in zip(missing, loaded):
+                    self.put(uid, profile)
+                    profiles[uid] = profile
+                    futures[uid].set_result(profile)
+            except Exception as e:
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+                        # Исключение уже передаётся вызывающему коду, не логируем его повторно
+                        future.exception()
+                raise
+            finally:
+                for uid in missing:
+                    self._loading.pop(uid, None)
+
+        for uid, future in waiting.items():
+            profiles[uid] = await future
+
+        return profiles
+
+    async def _fetch(self, uids):
+        profiles = await db_get_many(f"/{PUBLIC_PROFILES_PATH}/{uid}" for uid in uids)
+
+        # Для пользователей, у которых ещё нет проекции, строим её из полного документа
+        missing = [uid for uid, profile in zip(uids, profiles) if not is_projection(profile)]
+        if missing:
+            users = await db_get_many(f"/users/{uid}" for uid in missing)
+            backfill = {}
+            for uid, user_data in zip(missing, users):
+                profile = project_profile(user_data)
+                profiles[uids.index(uid)] = profile
+                if profile is not None:
+                    backfill[f"{PUBLIC_PROFILES_PATH}/{uid}"] = profile
+            if backfill:
+                await db_update_paths(backfill)
+
+        return profiles
+
+
+profile_cache = ProfileCache()
+
+
+async def get_profiles(uids):
+    return await profile_cache.load_many(uids)
+
+
+async def get_profile(uid):
+    if not uid:
+        return None
+    profiles = await profile_cache.load_many([uid])
+    return profiles.get(uid)
+
+
+async def save_user(uid, user_data):
+    # Сохраняет документ пользователя и его публичный профиль одним атомарным запросом
+    profile = project_profile(user_data)
+    await db_update_paths({
+        f"users/{uid}": user_data,
+        f"{PUBLIC_PROFILES_PATH}/{uid}": profile,
+    })
+    profile_cache.put(uid, profile)
+
+
+async def save_public_profile(uid, user_data):
+    # Обновляет публичный профиль после частичного изменения документа пользователя
+    profile = project_profile(user_data)
+    await db_set(f"/{PUBLIC_PROFILES_PATH}/{uid}", profile)
+    profile_cache.put(uid, profile)
+
+
+async def touch_last_active(uid, last_active):
+    # Обновляет время последней активности в документе пользователя и в профиле.
+    # Профиль сначала загружается: если проекции ещё нет, она строится целиком,
+    # а не появляется узел с одним last_active
+    updates = {f"users/{uid}/last_active": last_active}
+    profile = await get_profile(uid)
+    if profile is not None:
+        updates[f"{PUBLIC_PROFILES_PATH}/{uid}/last_active"] = last_active
+
+    await db_update_paths(updates)
+    if profile is not None:
+        profile_cache.put(uid, {**profile, "last_active": last_active})
@@ -5,10 +5,14 @@ from firebase_admin import db, storage
 from datetime import timedelta
 from urllib.parse import urlparse
 
+from utils.bookings import remove_service_bookings
+from utils.firebase_db import db_get, db_get_many, get_service, update_service, delete_service
+from utils.services_catalog import get_services_catalog
+from utils.uploads import upload_picture, upload_pictures
+
 async def get_payment_method(id: int):
     # Получаем все способы оплаты и переобразуем в массив
-    payment_method_ref = db.reference("/payments_methods")
-    payment_method_snapshot = payment_method_ref.get()
+    payment_method_snapshot = await db_get("/payments_methods")
 
     # Ищем способ оплаты по указанному id и возвращаем
     for method in payment_method_snapshot:
@@ -20,18 +24,30 @@ async def get_payment_method(id: int):
 
 # Пример функции для получения сервиса по service_id
 async def get_service_by_id(service_id: str):
-    ref = db.reference(f'/services/{service_id}')
-    return ref.get()
+    return await get_service(service_id)
+
+async def get_services_by_ids(ids):
+    # Получение услуг по массиву id с сохранением порядка; ненайденные услуги отдаются как None
+    catalog = await get_services_catalog()
+
+    unique_ids = list(dict.fromkeys(str(service_id) for service_id in ids))
+    services = {service_id: catalog.services.get(service_id) for service_id in unique_ids}
+
+    # Живая реплика содержит все услуги, иначе недостающие дочитываем из Firebase параллельно
+    missing = [service_id for service_id, data in services.items() if data is None]
+    if missing and not (catalog.replica is not None and catalog.replica.is_live()):
+        fetched = await db_get_many(f"/services/{service_id}" for service_id in missing)
+        services.update(zip(missing, fetched))
+
+    return [services[str(service_id)] for service_id in ids]
 
 # Пример функции для обновления сервиса в базе данных
 async def update_service_in_db(service_id: str, updated_data: dict):
-    ref = db.reference(f'/services/{service_id}')
-    ref.update(updated_data)
+    await update_service(service_id, updated_data)
 
 # Пример функции для удаления сервиса из базы данных
 async def delete_service_from_db(service_id: str):
-    ref = db.reference(f'/services/{service_id}')
-    ref.delete()
+    await delete_service(service_id)
 
 bucket = storage.bucket()
 
@@ -48,43 +64,13 @@ async def delete_service_image(file_url):
     blob.delete()
     print(f"File {file_path} deleted successfully.")
 
-async def upload_service_image(res_content, service_id, content_type):
-    bucket = storage.bucket()
-    random_id = shortuuid.uuid()
-    new_filename = f"{service_id}_{random_id}.jpg"
-    file_path = f"services/{service_id}/{new_filename}"
-
-    blob = bucket.blob(file_path)
-    blob.upload_from_string(res_content, content_type=content_type)
-
-    # Make the file public for infinite access
-    blob.make_public()
-
-    new_image_url = blob.public_url
+async def upload_service_image(picture):
+    return await upload_picture(picture)
 
-    return new_image_url
+async def upload_service_images(pictures):
+    # Картинки услуги загружаются параллельно, варианты URL возвращаются в порядке файлов
+    return await upload_pictures(pictures)
 
 async def remve_all_bookings_by_service_id(service_id):
-    # Находим всех пользователей
-    users_ref = db.reference('/users')
-    users_data = users_ref.get()
-
-    # Создаём массив с id пользователей у которых будет удалена услуга
-    users_ids = []
-
-    # Проходимся по пользователям
-    for user in users_data:
-        if "booked_services" in user:
-            # Проходимся по забронированным услугам пользователя
-            for booking in user["booked_services"]:
-                if booking["service_id"] == service_id:
-                    # Удаляем услугу из забронированных услуг пользователя
-                    user["booked_services"].remove(booking)
-                    # Сохраняем id пользователя
-                    users_ids.append(user["uid"])
-
-    # Сохарняем данные пользователей
-    users_ref.set(users_data)
-
-    # Возвращаем массив с id пользователей
-    return users_ids
\ No newline at end of file
+    # Удаляем брони услуги, найденные по индексу bookings_by_service
+    return await remove_service_bookings(service_id)
@@ -0,0 +1,385 @@
+import asyncio
+import base64
+import json
+import time
+import numpy as np
+
+from datetime import datetime
+
+from utils.firebase_db import db_get
+from utils.geo_index import GeoGridIndex, haversine_km, within_radius
+from utils.text_index import TextIndex, tokenize
+
+# Через сколько секунд снимок услуг считается устаревшим и перечитывается из Firebase
+CATALOG_REFRESH_SECONDS = 60
+# Начальная ёмкость колонок
+INITIAL_CAPACITY = 1024
+# Значение для отсутствующих целочисленных идентификаторов
+MISSING_ID = -1
+# Поля, по которым можно сортировать выдачу
+SORT_FIELDS = ("relevance", "distance", "price", "created_at", "rating_count")
+# Максимальный размер страницы выдачи
+MAX_PAGE_LIMIT = 100
+# Вес названия услуги относительно описания при текстовом поиске
+NAME_WEIGHT = 3
+
+# Колонки снимка: тип данных и значение для пустой строки
+COLUMNS = {
+    "alive": (np.bool_, False),
+    "lat": (np.float64, np.nan),
+    "lon": (np.float64, np.nan),
+    "price": (np.float64, np.nan),
+    "category_id": (np.int64, MISSING_ID),
+    "payment_method_id": (np.int64, MISSING_ID),
+    "is_active": (np.bool_, False),
+    "created_at": (np.float64, np.nan),
+    "rating_count": (np.float64, np.nan),
+}
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_timestamp(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def encode_cursor(key, service_id):
+    # Курсор хранит ключ сортировки и id последней отданной услуги
+    payload = json.dumps([key, service_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        key, service_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(key), str(service_id)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def _to_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return MISSING_ID
+
+
+class ServicesCatalog:
+    """
+    Колоночный снимок узла /services в памяти процесса.
+
+    Каждой услуге выделяется строка, а поля, по которым идёт фильтрация, хранятся
+    в параллельных массивах NumPy. Для категорий и способов оплаты поддерживаются
+    списки строк, а для координат сеточный геоиндекс, поэтому фильтры превращаются
+    в пересечения множеств и маски массивов. Название и описание услуги
+    индексируются для полнотекстового поиска. Пока к снимку подключена живая
+    реплика (см. utils.services_replica), он обновляется потоком событий
+    Firebase, иначе перечитывается из Firebase не чаще раза в
+    CATALOG_REFRESH_SECONDS. Изменения, сделанные через API, применяются к нему сразу.
+    """
+
+    def __init__(self):
+        self.services = {}
+        self.loaded_at = None
+        self.replica = None
+        self._reset_rows(INITIAL_CAPACITY)
+
+    def _reset_rows(self, capacity):
+        self.ids = []
+        self.rows = {}
+        self.free_rows = []
+        self.geo = GeoGridIndex()
+        # Строки услуг без координат: поиск по радиусу их не отсеивает
+        self.unlocated = set()
+        self.text = TextIndex()
+        self.by_category = {}
+        self.by_payment_method = {}
+        self.by_owner = {}
+        self.row_owners = {}
+        self.columns = {
+            name: np.full(capacity, empty, dtype=dtype)
+            for name, (dtype, empty) in COLUMNS.items()
+        }
+
+    def _grow(self, capacity):
+        for name, (dtype, empty) in COLUMNS.items():
+            column = self.columns[name]
+            grown = np.full(capacity, empty, dtype=dtype)
+            grown[: len(column)] = column
+            self.columns[name] = grown
+
+    def _allocate_row(self, service_id):
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.ids[row] = service_id
+        else:
+            row = len(self.ids)
+            self.ids.append(service_id)
+            if row >= len(self.columns["alive"]):
+                self._grow(len(self.columns["alive"]) * 2)
+
+        self.rows[service_id] = row
+        return row
+
+    def _unindex_row(self, row):
+        # Убираем строку из списков по категориям, способам оплаты и из геоиндекса
+        for postings, column in (
+            (self.by_category, "category_id"),
+            (self.by_payment_method, "payment_method_id"),
+        ):
+            key = int(self.columns[column][row])
+            posting = postings.get(key)
+            if posting is not None:
+                posting.discard(row)
+                if not posting:
+                    del postings[key]
+
+        self.geo.remove(row)
+        self.unlocated.discard(row)
+        self.text.remove(row)
+
+        owner_id = self.row_owners.pop(row, None)
+        owned = self.by_owner.get(owner_id)
+        if owned is not None:
+            owned.discard(row)
+            if not owned:
+                del self.by_owner[owner_id]
+
+        for name, (_, empty) in COLUMNS.items():
+            self.columns[name][row] = empty
+
+    def load(self, services):
+        services = services or {}
+
+        self.services = {}
+        self._reset_rows(max(INITIAL_CAPACITY, len(services)))
+
+        for service_id, service_data in services.items():
+            if service_data:
+                self.upsert(service_data, service_id=service_id)
+
+        self.loaded_at = time.monotonic()
+
+    def is_stale(self):
+        # Снимок, который ведёт живая реплика, не устаревает
+        if self.replica is not None and self.replica.is_live():
+            return False
+
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > CATALOG_REFRESH_SECONDS
+        )
+
+    def upsert(self, service_data, service_id=None):
+        service_id = service_id or service_data.get("id")
+        if not service_id:
+            return
+
+        self.services[service_id] = service_data
+
+        row = self.rows.get(service_id)
+        if row is None:
+            row = self._allocate_row(service_id)
+        else:
+            self._unindex_row(row)
+
+        columns = self.columns
+        columns["alive"][row] = True
+        columns["lat"][row] = _to_float(service_data.get("lat"))
+        columns["lon"][row] = _to_float(service_data.get("lon"))
+        columns["price"][row] = _to_float(service_data.get("price"))
+        columns["category_id"][row] = _to_id(service_data.get("service_category_id"))
+        columns["payment_method_id"][row] = _to_id(service_data.get("payment_method_id"))
+        columns["is_active"][row] = bool(service_data.get("is_active", False))
+        columns["created_at"][row] = _to_timestamp(service_data.get("created_at"))
+        columns["rating_count"][row] = _to_float(service_data.get("rating_count"))
+
+        self.by_category.setdefault(int(columns["category_id"][row]), set()).add(row)
+        self.by_payment_method.setdefault(
+            int(columns["payment_method_id"][row]), set()
+        ).add(row)
+
+        if not np.isnan(columns["lat"][row]) and not np.isnan(columns["lon"][row]):
+            self.geo.insert(row, columns["lat"][row], columns["lon"][row])
+        else:
+            self.unlocated.add(row)
+
+        owner_id = service_data.get("owner_id")
+        if owner_id:
+            self.row_owners[row] = owner_id
+            self.by_owner.setdefault(owner_id, set()).add(row)
+
+        self.text.add(
+            row,
+            [
+                (service_data.get("name"), NAME_WEIGHT),
+                (service_data.get("description"), 1),
+            ],
+        )
+
+    def remove(self, service_id):
+        self.services.pop(service_id, None)
+
+        row = self.rows.pop(service_id, None)
+        if row is None:
+            return
+
+        self._unindex_row(row)
+        self.ids[row] = None
+        self.free_rows.append(row)
+
+    def search(
+        self,
+        category_id=None,
+        payment_method_id=None,
+        min_price=None,
+        max_price=None,
+        lat=None,
+        lon=None,
+        distance=None,
+        is_active=None,
+        text=None,
+    ):
+        """
+        Возвращает номера строк услуг, подходящих под фильтры, в порядке строк.
+
+        Категория, способ оплаты и радиус сужают кандидатов через пересечение
+        множеств вместе с совпадениями текстового поиска, цена и активность проверяются масками по колонкам, а расстояние
+        считается пакетно только для оставшихся строк.
+        """
+
+        columns = self.columns
+        candidates = None
+
+        def narrow(rows):
+            nonlocal candidates
+            candidates = set(rows) if candidates is None else candidates & set(rows)
+
+        if text and tokenize(text):
+            narrow(self.text.search(text))
+        if category_id is not None:
+            narrow(self.by_category.get(category_id, ()))
+        if payment_method_id is not None:
+            narrow(self.by_payment_method.get(payment_method_id, ()))
+
+        by_distance = lat is not None and lon is not None and distance is not None
+        if by_distance:
+            narrow(self.unlocated.union(self.geo.query_radius(lat, lon, distance)))
+
+        if candidates is None:
+            rows = np.flatnonzero(columns["alive"][: len(self.ids)])
+        else:
+            rows = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+
+        mask = np.ones(len(rows), dtype=bool)
+        if min_price is not None:
+            mask &= columns["price"][rows] >= min_price
+        if max_price is not None:
+            mask &= columns["price"][rows] <= max_price
+        if is_active is not None:
+            mask &= columns["is_active"][rows] == is_active
+        rows = rows[mask]
+
+        if by_distance and len(rows):
+            mask, _ = within_radius(
+                lat, lon, columns["lat"][rows], columns["lon"][rows], distance
+            )
+            # Услуги без координат остаются в выдаче, как и до появления геоиндекса
+            unlocated = np.isnan(columns["lat"][rows]) | np.isnan(columns["lon"][rows])
+            rows = rows[mask | unlocated]
+
+        return rows
+
+    def paginate(
+        self,
+        rows,
+        sort=None,
+        descending=False,
+        limit=None,
+        cursor=None,
+        lat=None,
+        lon=None,
+        text=None,
+    ):
+        """
+        Сортирует строки и возвращает страницу, общее количество и курсор следующей страницы.
+
+        Порядок устойчив: при равных значениях сортировки строки упорядочиваются
+        по id услуги, а пустые значения всегда идут в конце. Без sort услуги
+        упорядочиваются только по id, как в узле Firebase. Сортировка relevance
+        по возрастанию отдаёт сначала самые релевантные запросу text услуги.
+        """
+
+        total = len(rows)
+        ids = np.array([self.ids[row] for row in rows], dtype=str)
+
+        if sort is None:
+            keys = np.zeros(total)
+        elif sort == "relevance":
+            if not text:
+                raise ValueError("Sorting by relevance requires a search query")
+            scores = self.text.search(text)
+            keys = -np.array([scores.get(row, 0.0) for row in rows], dtype=np.float64)
+        elif sort == "distance":
+            if lat is None or lon is None:
+                raise ValueError("Sorting by distance requires lat and lon")
+            keys = haversine_km(
+                lat, lon, self.columns["lat"][rows], self.columns["lon"][rows]
+            )
+        elif sort in SORT_FIELDS:
+            keys = self.columns[sort][rows].astype(np.float64)
+        else:
+            raise ValueError(f"Unknown sort field: {sort}")
+
+        # Для убывания сортируем по отрицательному значению, пустые значения уводим в конец
+        if descending:
+            keys = -keys
+        keys = np.where(np.isnan(keys), np.inf, keys)
+
+        order = np.lexsort((ids, keys))
+        rows, keys, ids = rows[order], keys[order], ids[order]
+
+        if cursor is not None:
+            cursor_key, cursor_id = decode_cursor(cursor)
+            start = np.flatnonzero(
+                (keys > cursor_key) | ((keys == cursor_key) & (ids > cursor_id))
+            )
+            start = start[0] if len(start) else len(rows)
+            rows, keys, ids = rows[start:], keys[start:], ids[start:]
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows, keys, ids = rows[:limit], keys[:limit], ids[:limit]
+            next_cursor = encode_cursor(float(keys[-1]), str(ids[-1]))
+
+        return rows, total, next_cursor
+
+    def owner_services(self, owner_id):
+        rows = sorted(self.by_owner.get(owner_id, ()))
+        return self.services_at(rows)
+
+    def services_at(self, rows):
+        return [self.services[self.ids[row]] for row in rows]
+
+
+services_catalog = ServicesCatalog()
+_refresh_lock = asyncio.Lock()
+
+
+async def get_services_catalog():
+    # Перечитываем снимок, если он устарел; параллельные запросы ждут одну загрузку
+    if services_catalog.is_stale():
+        async with _refresh_lock:
+            if services_catalog.is_stale():
+                services = await db_get("/services")
+                services_catalog.load(services)
+
+    return services_catalog
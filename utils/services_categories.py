@@ -5,11 +5,11 @@ from typing import Optional
 from firebase_admin import db
 
 from utils.categories import find_category_by_id
+from utils.firebase_db import db_get
 
 async def get_services_categories(id: Optional[int] = None):
     # Получаем все категории сервисов
-    services_categories_ref = db.reference("/services_categories")
-    services_categories_snapshot = services_categories_ref.get()
+    services_categories_snapshot = await db_get("/services_categories")
 
     # Если данных не найдено
     if not services_categories_snapshot:
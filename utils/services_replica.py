@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+import firebase_conf
+
+from firebase_admin import db
+
+from utils.services_catalog import services_catalog
+
+# Как часто проверяется, что поток событий Firebase всё ещё жив
+REPLICA_CHECK_SECONDS = 15
+# Через сколько секунд без событий поток считается неживым и переподключается.
+# Firebase переподключает оборвавшийся поток внутри того же потока и не передаёт
+# keep-alive в колбэк, поэтому только по живому потоку зависание не заметить
+REPLICA_MAX_AGE_SECONDS = int(os.getenv("REPLICA_MAX_AGE_SECONDS", 300))
+
+
+def _split_path(path):
+    return [segment for segment in (path or "").split("/") if segment]
+
+
+def _with_value(node, segments, value):
+    """
+    Возвращает копию узла, в которой по пути segments записано значение value.
+
+    Массивы Firebase приходят списками, поэтому для них сегмент пути является индексом.
+    """
+
+    if not segments:
+        return value
+
+    key = segments[0]
+    if isinstance(node, list) and key.isdigit():
+        node = list(node)
+        index = int(key)
+        node.extend([None] * (index + 1 - len(node)))
+        node[index] = _with_value(node[index], segments[1:], value)
+        return node
+
+    if isinstance(node, list):
+        node = {str(i): item for i, item in enumerate(node) if item is not None}
+    node = dict(node) if isinstance(node, dict) else {}
+
+    child = _with_value(node.get(key), segments[1:], value)
+    if child is None:
+        node.pop(key, None)
+    else:
+        node[key] = child
+    return node
+
+
+class ServicesReplica:
+    """
+    Локальная реплика узла /services, которую ведёт поток событий Firebase.
+
+    Первое событие потока содержит весь узел и засевает каталог, дальнейшие
+    события put и patch применяются к каталогу по отдельным услугам. Колбэк
+    Firebase вызывается в фоновом потоке, поэтому события передаются в цикл
+    событий и применяются там же, где каталог читают обработчики запросов.
+
+    Пока поток жив, каталог отстаёт от Firebase только на время доставки события.
+    Поток считается живым, только если последнее событие пришло не раньше
+    REPLICA_MAX_AGE_SECONDS назад, поэтому даже в тихом каталоге он
+    переподключается и каталог засевается заново не реже этого интервала.
+    Если поток оборвался или завис, каталог возвращается к перечитыванию по
+    CATALOG_REFRESH_SECONDS, а супервизор переподключает поток.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.catalog.replica = self
+        self.registration = None
+        self.synced = False
+        self.last_event_at = None
+        self._loop = None
+        self._supervisor = None
+
+    def is_live(self):
+        # У ListenerRegistration нет публичного признака, поэтому смотрим на его поток
+        thread = getattr(self.registration, "_thread", None)
+        return (
+            self.synced
+            and thread is not None
+            and thread.is_alive()
+            and time.monotonic() - self.last_event_at <= REPLICA_MAX_AGE_SECONDS
+        )
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self._connect()
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        await self._disconnect()
+
+    async def _connect(self):
+        try:
+            self.registration = await asyncio.to_thread(
+                db.reference("/services").listen, self._on_event
+            )
+        except Exception as e:
+            self.registration = None
+            print(f"Не удалось подключиться к потоку услуг: {e}")
+
+    async def _disconnect(self):
+        registration, self.registration = self.registration, None
+        self.synced = False
+        if registration is not None:
+            await asyncio.to_thread(registration.close)
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(REPLICA_CHECK_SECONDS)
+            if not self.is_live():
+                await self._disconnect()
+                await self._connect()
+
+    def _on_event(self, event):
+        # Вызывается в потоке Firebase: передаём событие в цикл событий
+        self._loop.call_soon_threadsafe(
+            self.apply_event, event.event_type, event.path, event.data
+        )
+
+    def apply_event(self, event_type, path, data):
+        segments = _split_path(path)
+        self.last_event_at = time.monotonic()
+
+        if event_type == "put":
+            if not segments:
+                # Весь узел целиком: первое событие потока или переподключение
+                self.catalog.load(data)
+                self.synced = True
+            else:
+                self._put(segments, data)
+        elif event_type == "patch":
+            for sub_path, value in (data or {}).items():
+                self._put(segments + _split_path(sub_path), value)
+
+    def _put(self, segments, value):
+        service_id = segments[0]
+
+        if len(segments) == 1:
+            if value is None:
+                self.catalog.remove(service_id)
+            else:
+                self.catalog.upsert(value, service_id=service_id)
+            return
+
+        # Изменилось вложенное поле: копируем услугу, чтобы не менять уже отданные словари
+        service = _with_value(self.catalog.services.get(service_id), segments[1:], value)
+        if service:
+            self.catalog.upsert(service, service_id=service_id)
+        else:
+            self.catalog.remove(service_id)
+
+
+services_replica = ServicesReplica(services_catalog)
@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+from firebase_admin import storage
+
+from utils.firebase_db import CHAT_META_PATH, db_get
+from utils.uploads import delete_blobs, run_storage
+
+# Раз в сколько секунд искать в бакете папки удалённых услуг и чатов
+STORAGE_SWEEP_INTERVAL = int(os.getenv("STORAGE_SWEEP_INTERVAL", 6 * 60 * 60))
+# Папки бакета вида {папка}/{id}/ и узлы базы, в которых должны существовать их записи
+SWEPT_PREFIXES = {
+    "services": "/services",
+    "chats": f"/{CHAT_META_PATH}",
+}
+
+
+def _list_paths(prefix):
+    return [blob.name for blob in storage.bucket().list_blobs(prefix=prefix)]
+
+
+def _list_subfolders(prefix):
+    # Возвращает вложенные папки prefix, например {"services/abc/", ...}
+    iterator = storage.bucket().list_blobs(prefix=prefix, delimiter="/")
+    for _ in iterator.pages:
+        pass
+    return set(iterator.prefixes)
+
+
+class StorageGC:
+    """
+    Фоновое удаление файлов из Firebase Storage.
+
+    Папки ставятся в очередь и удаляются пакетными запросами, не задерживая ответ.
+    Периодически бакет проверяется на папки услуг и чатов, записей которых уже
+    нет в базе, и такие папки тоже ставятся в очередь на удаление.
+    """
+
+    def __init__(self, sweep_interval=STORAGE_SWEEP_INTERVAL):
+        self.sweep_interval = sweep_interval
+        self._queue = None
+        self._pending = set()
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._work()),
+            asyncio.create_task(self._sweep_periodically()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue_prefix(self, prefix):
+        # Ставит папку в очередь на удаление; повторная постановка игнорируется
+        if self._queue is None or prefix in self._pending:
+            return
+
+        self._pending.add(prefix)
+        self._queue.put_nowait(prefix)
+
+    async def _work(self):
+        while True:
+            prefix = await self._queue.get()
+            self._pending.discard(prefix)
+            try:
+                paths = await run_storage(_list_paths, prefix)
+                await run_storage(delete_blobs, paths)
+            except Exception as e:
+                print(f"Ошибка удаления файлов {prefix}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _sweep_periodically(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Ошибка поиска неиспользуемых файлов: {e}")
+
+    async def sweep(self):
+        # Ставит в очередь папки, для которых нет записи в базе
+        for folder, db_path in SWEPT_PREFIXES.items():
+            existing_ids = await db_get(db_path, shallow=True) or {}
+            prefixes = await run_storage(_list_subfolders, f"{folder}/")
+
+            for prefix in prefixes:
+                record_id = prefix[len(folder) + 1:].split("/")[0]
+                if record_id not in existing_ids:
+                    self.enqueue_prefix(prefix)
+
+
+storage_gc = StorageGC()
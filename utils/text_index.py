@@ -0,0 +1,149 @@
+import bisect
+import math
+import re
+
+# Слова: буквы любых алфавитов (латиница, кириллица) и цифры
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Апострофы узбекской латиницы (o‘, g‘) считаются частью слова и удаляются
+APOSTROPHES_RE = re.compile(r"['‘’ʻʼ`]")
+# Минимальная длина префикса, по которому ищутся продолжения слова
+MIN_PREFIX_LENGTH = 2
+# Вес совпадения по префиксу относительно точного совпадения
+PREFIX_WEIGHT = 0.5
+
+
+def normalize(text):
+    # Приводим текст к нижнему регистру без учёта "ё" и апострофов
+    text = text.casefold().replace("ё", "е")
+    return APOSTROPHES_RE.sub("", text)
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_RE.findall(normalize(str(text)))
+
+
+class TextIndex:
+    """
+    Инвертированный индекс для полнотекстового поиска по нескольким полям.
+
+    Для каждого слова хранится словарь ключ документа -> вес, где вес складывается
+    из количества вхождений слова в поля документа, умноженного на вес поля.
+    Слова запроса ищутся как целиком, так и по префиксу, а все слова запроса
+    должны найтись в документе.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self._sorted_tokens = []
+        self._dirty = False
+
+    def __len__(self):
+        return len(self.documents)
+
+    def clear(self):
+        self.postings = {}
+        self.documents = {}
+        self._sorted_tokens = []
+        self._dirty = False
+
+    def add(self, key, fields):
+        """
+        Индексирует документ.
+
+        Args:
+            key: Ключ документа.
+            fields (list): Пары (текст, вес поля).
+        """
+
+        self.remove(key)
+
+        weights = {}
+        for text, weight in fields:
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0) + weight
+
+        for token, weight in weights.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                self._dirty = True
+            posting[key] = weight
+
+        self.documents[key] = tuple(weights)
+
+    def remove(self, key):
+        tokens = self.documents.pop(key, None)
+        if tokens is None:
+            return
+
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(key, None)
+            if not posting:
+                del self.postings[token]
+                self._dirty = True
+
+    def _expand(self, token):
+        # Возвращает слова индекса, начинающиеся с token, кроме самого token
+        if len(token) < MIN_PREFIX_LENGTH:
+            return []
+
+        if self._dirty:
+            self._sorted_tokens = sorted(self.postings)
+            self._dirty = False
+
+        tokens = self._sorted_tokens
+        start = bisect.bisect_right(tokens, token)
+        end = bisect.bisect_left(tokens, token + "\uffff")
+        return tokens[start:end]
+
+    def search(self, query):
+        """
+        Возвращает словарь ключ документа -> релевантность.
+
+        Релевантность складывается по словам запроса из веса совпадения,
+        умноженного на обратную частоту слова в индексе.
+        """
+
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return {}
+
+        total = max(len(self.documents), 1)
+        scores = None
+
+        for query_token in dict.fromkeys(query_tokens):
+            token_scores = {}
+
+            matches = [(query_token, 1.0)] + [
+                (token, PREFIX_WEIGHT) for token in self._expand(query_token)
+            ]
+            for token, match_weight in matches:
+                posting = self.postings.get(token)
+                if not posting:
+                    continue
+                idf = math.log(1 + total / len(posting))
+                for key, weight in posting.items():
+                    score = weight * match_weight * idf
+                    if score > token_scores.get(key, 0):
+                        token_scores[key] = score
+
+            # Документ должен содержать каждое слово запроса
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    key: score + token_scores[key]
+                    for key, score in scores.items()
+                    if key in token_scores
+                }
+
+            if not scores:
+                return {}
+
+        return scores
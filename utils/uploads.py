@@ -0,0 +1,362 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import os
+import time
+import firebase_conf
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+from firebase_admin import storage
+
+from utils.images import (
+    IMAGE_CONTENT_TYPE,
+    IMAGE_EXTENSION,
+    IMAGE_EXTENSIONS,
+    IMAGE_VARIANTS,
+    decoded_size,
+    make_variants,
+)
+from utils.firebase_db import db_transaction
+
+# Сколько файлов одного запроса обрабатывается и загружается в Storage одновременно
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 8))
+# Количество потоков для обработки изображений и запросов к Firebase Storage
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", 16))
+# Сколько памяти в байтах могут занимать декодированные изображения одного запроса
+UPLOAD_MEMORY_LIMIT = int(os.getenv("UPLOAD_MEMORY_LIMIT", 64 * 1024 * 1024))
+# Размер блока возобновляемой загрузки, должен быть кратен 256 КБ
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024))
+# ACL, который выставляется при загрузке, чтобы не делать отдельный make_public()
+PUBLIC_READ_ACL = "publicRead"
+# Папка бакета, в которой изображения хранятся по хэшу содержимого
+IMAGES_PREFIX = "images"
+# Узел базы с количеством ссылок на каждое изображение
+IMAGE_REFS_PATH = "image_refs"
+# Максимальное количество удалений в одном пакетном запросе к Storage
+DELETE_BATCH_SIZE = 100
+# Хост публичных URL файлов Firebase Storage
+STORAGE_HOST = "storage.googleapis.com"
+# Размер блока при подсчёте хэша файла
+HASH_CHUNK_SIZE = 1024 * 1024
+# Сколько секунд действует отметка об удалении вариантов изображения; если удалявший
+# процесс упал, по её истечении изображение снова можно загружать
+IMAGE_DELETE_TIMEOUT = 60
+# Пауза между попытками взять ссылку на изображение, варианты которого удаляются
+IMAGE_DELETE_POLL_INTERVAL = 0.2
+
+_executor = ThreadPoolExecutor(
+    max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage-io"
+)
+
+
+async def run_storage(func, *args, **kwargs):
+    # Выполняет блокирующий вызов Firebase Storage в пуле потоков
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def _upload_file(file_path, file, content_type):
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+
+    # Большие файлы отправляются возобновляемой загрузкой по блокам
+    chunk_size = UPLOAD_CHUNK_SIZE if size > UPLOAD_CHUNK_SIZE else None
+    blob = storage.bucket().blob(file_path, chunk_size=chunk_size)
+
+    # Файл читается потоком, публичный доступ задаётся в том же запросе
+    try:
+        blob.upload_from_file(
+            file,
+            size=size,
+            content_type=content_type,
+            predefined_acl=PUBLIC_READ_ACL,
+        )
+    finally:
+        file.close()
+
+    return blob.public_url
+
+
+def variant_path(base_path, variant):
+    # Путь варианта изображения в бакете, например services/1/1_abc_thumbnail.webp
+    return f"{base_path}_{variant}.{IMAGE_EXTENSION}"
+
+
+def picture_paths(file_path):
+    """
+    Возвращает пути всех вариантов изображения по пути одного из них.
+
+    Для картинок, загруженных до появления вариантов, возвращается только сам путь.
+    """
+
+    for variant in IMAGE_VARIANTS:
+        for extension in IMAGE_EXTENSIONS.values():
+            suffix = f"_{variant}.{extension}"
+            if file_path.endswith(suffix):
+                base_path = file_path[:-len(suffix)]
+                return [f"{base_path}_{name}.{extension}" for name in IMAGE_VARIANTS]
+    return [file_path]
+
+
+def content_hash(file):
+    # BLAKE2-хэш содержимого файла, файл читается блоками
+    file.seek(0)
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def blob_path_from_url(url):
+    # Путь файла в бакете по его публичному URL, None для сторонних адресов
+    parsed_url = urlparse(url)
+    path = unquote(parsed_url.path).lstrip("/")
+    bucket_prefix = f"{storage.bucket().name}/"
+    if parsed_url.netloc != STORAGE_HOST or not path.startswith(bucket_prefix):
+        return None
+    return path[len(bucket_prefix):]
+
+
+def _variant_urls(base_path):
+    bucket = storage.bucket()
+    return {name: bucket.blob(variant_path(base_path, name)).public_url for name in IMAGE_VARIANTS}
+
+
+def delete_blobs(paths):
+    # Удаляет файлы пакетными запросами; отсутствующие файлы пропускаются
+    bucket = storage.bucket()
+    paths = list(paths)
+    for start in range(0, len(paths), DELETE_BATCH_SIZE):
+        with bucket.client.batch(raise_exception=False):
+            for path in paths[start:start + DELETE_BATCH_SIZE]:
+                bucket.blob(path).delete()
+
+
+class _DeletePending(Exception):
+    # Прерывает транзакцию: варианты изображения сейчас удаляются
+    pass
+
+
+def _ref_state(node):
+    """
+    Разбирает узел image_refs/{хэш} в (ссылок, загружены ли варианты, время начала удаления).
+
+    Узел: {"count": ссылок, "uploaded": загружены ли варианты, "deleting": время},
+    deleting есть только пока удаляются варианты изображения без ссылок. Старые
+    узлы хранят только число ссылок, их варианты уже загружены.
+    """
+
+    if isinstance(node, dict):
+        return node.get("count") or 0, bool(node.get("uploaded")), node.get("deleting") or 0
+    return node or 0, bool(node), 0
+
+
+async def _acquire_ref(image_hash):
+    # Атомарно добавляет ссылку на изображение и возвращает, загружены ли его варианты.
+    # Пока варианты удаляются, ссылка не берётся: иначе удаление могло бы стереть
+    # файлы, которые этот вызов загрузит заново
+    def transaction_update(node):
+        count, uploaded, deleting = _ref_state(node)
+        if deleting and time.time() - deleting < IMAGE_DELETE_TIMEOUT:
+            raise _DeletePending()
+        return {"count": count + 1, "uploaded": uploaded}
+
+    while True:
+        try:
+            node = await db_transaction(f"/{IMAGE_REFS_PATH}/{image_hash}", transaction_update)
+            return node["uploaded"]
+        except _DeletePending:
+            await asyncio.sleep(IMAGE_DELETE_POLL_INTERVAL)
+
+
+async def _mark_uploaded(image_hash):
+    def transaction_update(node):
+        count, _, _ = _ref_state(node)
+        return {"count": count, "uploaded": count > 0}
+
+    await db_transaction(f"/{IMAGE_REFS_PATH}/{image_hash}", transaction_update)
+
+
+async def _release_ref(image_hash):
+    # Атомарно снимает ссылку и возвращает количество оставшихся. Когда ссылок
+    # не осталось, в той же транзакции ставится отметка об удалении вариантов.
+    # Транзакция Firebase не может удалить узел, а отдельное удаление гонялось бы
+    # с новой загрузкой тех же байтов, поэтому узел без ссылок остаётся с нулём
+    def transaction_update(node):
+        count, uploaded, _ = _ref_state(node)
+        count = max(count - 1, 0)
+        if count > 0:
+            return {"count": count, "uploaded": uploaded}
+        return {"count": 0, "uploaded": False, "deleting": time.time()}
+
+    node = await db_transaction(f"/{IMAGE_REFS_PATH}/{image_hash}", transaction_update)
+    return node["count"]
+
+
+async def _finish_delete(image_hash):
+    # Снимает отметку об удалении, после чего ссылку на изображение снова можно взять
+    def transaction_update(node):
+        count, uploaded, _ = _ref_state(node)
+        return {"count": count, "uploaded": uploaded}
+
+    await db_transaction(f"/{IMAGE_REFS_PATH}/{image_hash}", transaction_update)
+
+
+async def _release_image(image_hash, paths):
+    # Снимает ссылку и удаляет варианты, если ссылок не осталось
+    if await _release_ref(image_hash) > 0:
+        return
+    try:
+        await run_storage(delete_blobs, paths)
+    finally:
+        await _finish_delete(image_hash)
+
+
+class MemoryBudget:
+    """
+    Ограничение памяти, которую одновременно занимают декодированные изображения.
+
+    Задача резервирует оценку нужной ей памяти и ждёт, пока другие задачи не
+    освободят достаточно. Изображение больше всего лимита обрабатывается, когда
+    других резервов нет.
+    """
+
+    def __init__(self, limit=UPLOAD_MEMORY_LIMIT):
+        self.limit = limit
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, size):
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self.used == 0 or self.used + size <= self.limit
+            )
+            self.used += size
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.used -= size
+                self._condition.notify_all()
+
+
+async def upload_picture(picture, budget=None):
+    """
+    Сохраняет UploadFile в Firebase Storage по хэшу содержимого.
+
+    Картинка уменьшается до вариантов из IMAGE_VARIANTS, которые загружаются в
+    images/{хэш}_{вариант}. Если такие же байты уже загружены, загрузка
+    пропускается и только увеличивается счётчик ссылок. Пока первая загрузка
+    не завершилась, параллельные вызовы с теми же байтами загружают варианты
+    сами: запись по хэшу идемпотентна, и неудача одной загрузки не оставит
+    другим ссылку на несуществующие файлы. Исходный файл читается
+    из временного файла UploadFile и целиком в память не загружается.
+
+    Args:
+        picture: Загружаемый файл.
+        budget: MemoryBudget запроса; по умолчанию создаётся свой.
+
+    Returns:
+        Словарь {название варианта: публичный URL}.
+    """
+
+    budget = budget or MemoryBudget()
+
+    image_hash = await run_storage(content_hash, picture.file)
+    base_path = f"{IMAGES_PREFIX}/{image_hash}"
+
+    if await _acquire_ref(image_hash):
+        return _variant_urls(base_path)
+
+    try:
+        size = await run_storage(decoded_size, picture.file)
+        async with budget.reserve(size):
+            variants = await run_storage(make_variants, picture.file)
+
+        urls = await asyncio.gather(*[
+            run_storage(_upload_file, variant_path(base_path, name), file, IMAGE_CONTENT_TYPE)
+            for name, file in variants.items()
+        ])
+    except Exception:
+        # Изображение не сохранено - ссылку не учитываем, частично загруженные
+        # варианты удаляются, если на них больше никто не ссылается
+        await _release_image(image_hash, [variant_path(base_path, name) for name in IMAGE_VARIANTS])
+        raise
+
+    await _mark_uploaded(image_hash)
+    return dict(zip(variants, urls))
+
+
+async def upload_pictures(pictures, concurrency=UPLOAD_CONCURRENCY, memory_limit=UPLOAD_MEMORY_LIMIT):
+    """
+    Параллельно загружает несколько файлов в Firebase Storage.
+
+    Одновременно обрабатывается не больше concurrency файлов, поэтому запрос
+    с несколькими фотографиями занимает примерно время самой долгой загрузки.
+    Декодированные изображения запроса занимают не больше memory_limit байт.
+    Если хотя бы один файл не загрузился, ссылки на уже загруженные снимаются
+    и исключение передаётся дальше.
+
+    Args:
+        pictures: Список UploadFile.
+        concurrency: Максимальное количество одновременно обрабатываемых файлов.
+        memory_limit: Лимит памяти запроса на декодированные изображения.
+
+    Returns:
+        Список словарей {название варианта: публичный URL} в порядке файлов.
+    """
+
+    if not pictures:
+        return []
+
+    semaphore = asyncio.Semaphore(concurrency)
+    budget = MemoryBudget(memory_limit)
+
+    async def upload(picture):
+        async with semaphore:
+            return await upload_picture(picture, budget)
+
+    results = await asyncio.gather(
+        *[upload(picture) for picture in pictures], return_exceptions=True
+    )
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        await release_pictures(
+            result["full"] for result in results if not isinstance(result, BaseException)
+        )
+        raise errors[0]
+
+    return results
+
+
+async def release_picture(url):
+    """
+    Снимает ссылку на изображение и удаляет его варианты, когда ссылок не осталось.
+
+    Картинки, загруженные до хранения по хэшу, удаляются сразу.
+
+    Args:
+        url: Публичный URL любого варианта изображения.
+    """
+
+    path = blob_path_from_url(url)
+    if path is None:
+        return
+    paths = picture_paths(path)
+
+    if path.startswith(f"{IMAGES_PREFIX}/"):
+        image_hash = path[len(IMAGES_PREFIX) + 1:].split("_")[0]
+        await _release_image(image_hash, paths)
+        return
+
+    await run_storage(delete_blobs, paths)
+
+
+async def release_pictures(urls):
+    await asyncio.gather(*[release_picture(url) for url in urls])
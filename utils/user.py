@@ -5,6 +5,9 @@ from firebase_admin import auth, credentials, db, storage
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta
 
+from utils.profiles import touch_last_active
+from utils.uploads import upload_picture
+
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -40,14 +43,11 @@ async def update_last_active(uid: str):
         uid: UID пользователя.
     """
 
-    # Получение ссылки на узел пользователя по UID
-    user_ref = db.reference(f"users/{uid}")
-
     # Словарь с новыми данными
     new_data = {"last_active": datetime.now().isoformat()}
 
-    # Обновление данных пользователя
-    user_ref.update(new_data)
+    # Обновление данных пользователя и его публичного профиля
+    await touch_last_active(uid, new_data["last_active"])
 
 async def upload_user_avatar(res_content, uid):
     bucket = storage.bucket()
@@ -58,18 +58,9 @@ async def upload_user_avatar(res_content, uid):
 
     return new_avatar_url
 
-async def upload_user_avatar_with_file(res_content, uid, content_type):
-    bucket = storage.bucket()
-
-    blob = bucket.blob(f'users/avatars/{uid}.jpg')
-    blob.upload_from_string(res_content, content_type=content_type)
-
-    # Make the file public for infinite access
-    blob.make_public()
-
-    new_image_url = blob.public_url
-
-    return new_image_url
+async def upload_user_avatar_with_file(avatar):
+    # Загружает аватар и его уменьшенные варианты, возвращает их URL
+    return await upload_picture(avatar)
 
 # Пример функции для удаления картинки из Firebase Storage
 async def delete_picture_from_storage(picture_url: str):